@@ -0,0 +1,91 @@
+import logging as log
+import os
+import socket
+import sys
+import time
+from threading import Thread
+from py_intercom.networking.intercom_server import IntercomServer
+from py_intercom.networking.batched_writer import BatchedWriter
+
+
+class UnbatchedServer(IntercomServer):
+    """
+    The baseline: one blocking `sendall` per frame per client on the broadcasting thread, as `_send_to_client` did before `BatchedWriter`.
+    """
+    def _send_to_client(self, client: BatchedWriter, message: bytes) -> None:
+        log.debug(f"Sending message to client `{client.sock}`")
+        client.sock.sendall(message)
+        client.frames_written += 1
+        client.bytes_written += len(message)
+        client.syscalls += 1
+
+
+def drain(sock: socket.socket) -> None:
+    try:
+        while sock.recv(1 << 16):
+            pass
+    except OSError:
+        pass
+
+
+def broadcast_benchmark(hub: IntercomServer, port: int, clients: int = 8, messages: int = 5000, stalled: int = 0, timeout: float = 60.0) -> dict[str, float]:
+    """
+    Broadcasts `messages` commands from `hub` to `clients` loopback clients that read as fast as they can, and to `stalled` more that never read.
+    :return: The write stats of the hub over the reading clients, the frames dropped for the stalled ones, and the reading clients' frames per second.
+    """
+    IntercomServer.PORT = port
+    hub.start_server(discoverable=False)
+    time.sleep(0.2)
+
+    readers = [socket.create_connection((IntercomServer.LOCALHOST, port)) for _ in range(clients)]
+    idle = [socket.create_connection((IntercomServer.LOCALHOST, port)) for _ in range(stalled)]
+    for sock in readers:
+        Thread(target=drain, args=[sock], daemon=True).start()
+    deadline = time.monotonic() + timeout
+    while len(hub._clients) < clients + stalled and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stalled_ports = {sock.getsockname()[1] for sock in idle}
+    writers = [w for w in hub._clients.snapshot() if w.sock.getpeername()[1] not in stalled_ports]
+    idle_writers = [w for w in hub._clients.snapshot() if w.sock.getpeername()[1] in stalled_ports]
+
+    start = time.perf_counter()
+    for i in range(messages):
+        hub.send_data({"command_id": "shut_down_computer", "i": i}, "BROADCAST")
+    while sum(w.frames_written for w in writers) < clients * messages and time.monotonic() < deadline:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames": sum(w.frames_written for w in writers),
+        "syscalls": sum(w.syscalls for w in writers),
+        "dropped": sum(w.frames_dropped for w in idle_writers),
+        "frames_per_second": sum(w.frames_written for w in writers) / elapsed,
+    }
+
+
+def run(name: str, hub: IntercomServer, port: int, **kwargs) -> None:
+    stats = broadcast_benchmark(hub, port, **kwargs)
+    line = f"{name:36}: {stats['frames']:6.0f} frames | {stats['syscalls']:6.0f} syscalls | {stats['frames_per_second']:8,.0f} frames/s"
+    if "stalled" in kwargs:
+        line += f" | {stats['dropped']:.0f} frames dropped for the stalled client"
+    print(line)
+
+
+def batched(delay: float) -> IntercomServer:
+    hub = IntercomServer()
+    hub.WRITE_BATCH_DELAY = delay
+    return hub
+
+
+if __name__ == "__main__":
+    # Run from the repository root as `python -m helpers.generic.broadcast_benchmark [port]`, the runs use consecutive ports from `port`
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 17091
+    print("8 loopback clients, 5000 broadcasts")
+    run("one sendall per frame (before)", UnbatchedServer(), port)
+    run("batched, inline while idle (default)", batched(0.0), port + 1)
+    run("batched, 2 ms delay", batched(0.002), port + 2)
+    print("Same, plus a client that never reads")
+    run("batched, inline while idle (default)", batched(0.0), port + 3, stalled=1, messages=50000)
+    # The hubs' accept loops cannot be stopped, so exit without joining them
+    os._exit(0)
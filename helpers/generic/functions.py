@@ -17,6 +17,6 @@ def enable_log_to_stdout(level: str = "DEBUG"):
 def ip4_addresses():
     ip_list = []
     for interface in interfaces():
-        for link in ifaddresses(interface)[AF_INET]:
+        for link in ifaddresses(interface).get(AF_INET, []):
             ip_list.append(link['addr'])
     return ip_list
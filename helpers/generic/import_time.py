@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import time
+
+
+def import_time_report(module: str, top: int = 15) -> tuple[float, list[tuple[int, int, str]]]:
+    """
+    Imports `module` in a fresh interpreter with `python -X importtime`.
+    :return: The wall time of the interpreter in seconds, and the `top` slowest imports as `(self_us, cumulative_us, name)`, sorted by cumulative time.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing `{module}` failed:\n{result.stderr}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(self_us), int(cumulative_us), name.strip()))
+
+    entries.sort(key=lambda e: e[1], reverse=True)
+    return wall, entries[:top]
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] if len(sys.argv) > 1 else [
+        "py_intercom.networking.intercom_server",
+        "py_intercom.intercom",
+        "main",
+    ]
+    for module in modules:
+        try:
+            wall, entries = import_time_report(module)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            continue
+        print(f"{module}: {wall * 1000:.1f} ms interpreter wall time")
+        for self_us, cumulative_us, name in entries:
+            print(f"  {cumulative_us / 1000:8.1f} ms cumulative | {self_us / 1000:8.1f} ms self | {name}")
@@ -0,0 +1,108 @@
+import json
+import random
+import string
+import sys
+import timeit
+from typing import Optional
+from py_intercom.command.keyword_parser import KeywordParser
+from py_intercom.command.fuzzy_keyword_parser import FuzzyKeywordParser
+
+# (prompt, expected command), the commands `turn_off` and `shut_down_computer` stop a node, so their near misses must not match
+CASES: dict[str, list[tuple[str, Optional[str]]]] = {
+    "en_US": [
+        ("please turn off", "turn_off"),
+        ("Shut up!", "turn_off"),
+        ("shut yourself dwon", "turn_off"),
+        ("change the langauge to hebrew", "set_language"),
+        ("set language to hebrw", "set_language"),
+        ("turn off the computer now", "shut_down_computer"),
+        ("shut off the computer immediatly", "shut_down_computer"),
+        ("make me an offer", None),
+        ("what is the weather", None),
+        ("burn off the weeds", None),
+        ("shot up the stairs", None),
+        ("shit yourself down", None),
+        ("burn off the computer now", None),
+        ("turn of the page", None),
+        ("shut the door", None),
+        ("shut yourself in", None),
+    ],
+    "he_IL": [
+        ("שנה שפה לאנגלית", "set_language"),
+        ("תכבה את עצמך", "turn_off"),
+        ("תִּכְבֶּה אֶת עַצְמְךָ", "turn_off"),
+        ("שתוק", "turn_off"),
+        ("תכבה את המחשב עכשיו", "shut_down_computer"),
+        ("מה השעה", None),
+        ("תכבד את עצמך", None),
+        ("שתול עץ", None),
+        ("סתם פה", None),
+        ("תסגור את הדלת", None),
+        ("תכבה את המחשב מחר", None),
+    ],
+}
+
+
+# Trigger words with repeated bigrams, which have fewer distinct bigrams than letters, and one edit typos of them
+REPEATED_BIGRAM_TRIGGERS: dict[str, list[list[str]]] = {"fruit": [["banana"]], "song": [["lalala"]], "scream": [["aaaaaaaa"]]}
+REPEATED_BIGRAM_CASES: list[tuple[str, Optional[str]]] = [
+    ("bzanana", "fruit"),
+    ("anana", "fruit"),
+    ("bananna", "fruit"),
+    ("lalalla", "song"),
+    ("lallaa", "song"),
+    ("aaaaaaa", "scream"),
+    ("aaaabaaaa", "scream"),
+    ("cabana", None),
+]
+
+
+def check(parser: KeywordParser | FuzzyKeywordParser, cases: list[tuple[str, Optional[str]]]) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """
+    :return: The cases `parser` got wrong, as `(prompt, expected, found)`.
+    """
+    return [(prompt, expected, found) for prompt, expected in cases if (found := parser.parse(prompt)) != expected]
+
+
+def seconds_per_prompt(parser: KeywordParser | FuzzyKeywordParser, prompts: list[str], number: int = 1000) -> float:
+    return timeit.timeit(lambda: [parser.parse(prompt) for prompt in prompts], number=number) / (number * len(prompts))
+
+
+def random_triggers(commands: int = 1000, per_command: int = 3, seed: int = 0) -> dict[str, list[list[str]]]:
+    rng = random.Random(seed)
+    word = lambda: "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+    return {f"command_{c}": [[word() for _ in range(rng.randint(1, 3))] for _ in range(per_command)] for c in range(commands)}
+
+
+if __name__ == "__main__":
+    # Run from the repository root as `python -m helpers.generic.matcher_accuracy`, exits with 1 if the fuzzy matcher gets a case wrong
+    with open("commands.json", "r") as f:
+        command_map = json.load(f)
+
+    failed = False
+    for language, cases in CASES.items():
+        triggers = {command_id: command_map[language][command_id]["triggers"] for command_id in command_map[language].keys()}
+        prompts = [prompt for prompt, _expected in cases]
+        for name, parser in {"substring": KeywordParser(triggers), "fuzzy": FuzzyKeywordParser(triggers)}.items():
+            wrong = check(parser, cases)
+            print(f"{language} {name:9}: {len(cases) - len(wrong)}/{len(cases)} correct, {seconds_per_prompt(parser, prompts) * 1e6:.1f} us per prompt")
+            if name == "fuzzy":
+                for prompt, expected, found in wrong:
+                    print(f"  `{prompt}`: expected {expected}, found {found}", file=sys.stderr)
+                failed = failed or bool(wrong)
+
+    parser = FuzzyKeywordParser(REPEATED_BIGRAM_TRIGGERS)
+    wrong = check(parser, REPEATED_BIGRAM_CASES)
+    print(f"repeated bigrams fuzzy: {len(REPEATED_BIGRAM_CASES) - len(wrong)}/{len(REPEATED_BIGRAM_CASES)} correct")
+    for prompt, expected, found in wrong:
+        print(f"  `{prompt}`: expected {expected}, found {found}", file=sys.stderr)
+    failed = failed or bool(wrong)
+
+    triggers = random_triggers()
+    parser = FuzzyKeywordParser(triggers)
+    prompts = [" ".join(trigger) for trigger in list(triggers.values())[0]] + ["please do something else entirely"]
+    uncached = seconds_per_prompt(FuzzyKeywordParser(triggers, cache_size=0), prompts, number=100)
+    print(f"{sum(len(t) for t in triggers.values())} random triggers, fuzzy: {uncached * 1e3:.2f} ms per prompt uncached, {seconds_per_prompt(parser, prompts) * 1e3:.2f} ms cached")
+
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
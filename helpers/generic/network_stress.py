@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+from collections import Counter, deque
+from queue import SimpleQueue, Empty
+from threading import Thread, Lock
+from py_intercom.networking.intercom_server import IntercomServer
+from py_intercom.networking.client_registry import ClientRegistry
+
+
+class LockedQueue:
+    """
+    The lock-everything baseline for `SimpleQueue`: a deque guarded by one lock.
+    """
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._items: deque = deque()
+
+    def put(self, item) -> None:
+        with self._lock:
+            self._items.append(item)
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._items:
+                raise Empty
+            return self._items.popleft()
+
+
+class LockedRegistry:
+    """
+    The lock-everything baseline for `ClientRegistry`: a list guarded by one lock, copied by readers.
+    """
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._clients: list = []
+
+    def add(self, client) -> None:
+        with self._lock:
+            self._clients.append(client)
+
+    def remove(self, client) -> None:
+        with self._lock:
+            self._clients.remove(client)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return list(self._clients)
+
+
+def queue_throughput(queue, producers: int = 8, per_producer: int = 20000) -> float:
+    """
+    :return: Items per second moved from `producers` threads to a single consumer.
+    """
+    total = producers * per_producer
+
+    def produce() -> None:
+        for i in range(per_producer):
+            queue.put(i)
+
+    start = time.perf_counter()
+    threads = [Thread(target=produce) for _ in range(producers)]
+    for t in threads:
+        t.start()
+    received = 0
+    while received < total:
+        try:
+            queue.get_nowait()
+            received += 1
+        except Empty:
+            pass
+    for t in threads:
+        t.join()
+    return total / (time.perf_counter() - start)
+
+
+def registry_throughput(registry, readers: int = 8, duration: float = 1.0) -> float:
+    """
+    :return: Snapshots per second taken by `readers` threads while another thread keeps connecting and disconnecting clients.
+    """
+    for i in range(10):
+        registry.add(object())
+    counts = [0] * readers
+    stop = [False]
+
+    def read(index: int) -> None:
+        while not stop[0]:
+            for _client in registry.snapshot():
+                pass
+            counts[index] += 1
+
+    def churn() -> None:
+        while not stop[0]:
+            client = object()
+            registry.add(client)
+            registry.remove(client)
+
+    threads = [Thread(target=read, args=[i]) for i in range(readers)] + [Thread(target=churn)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop[0] = True
+    for t in threads:
+        t.join()
+    return sum(counts) / duration
+
+
+class DeliveryCounter:
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self.received: Counter = Counter()
+
+    def on_message(self, message: IntercomServer.Message) -> None:
+        if "stress" not in message.data:
+            return
+        with self._lock:
+            self.received[message.data["stress"]] += 1
+
+
+def wait_until(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def stress(port: int, clients: int = 8, senders: int = 8, messages: int = 200, churners: int = 4, timeout: float = 30.0) -> bool:
+    """
+    Connects `clients` clients to a local hub from concurrent threads, then has `senders` threads per client send `messages` messages each to themselves through the hub,
+    while `churners` more threads keep connecting, sending from and disconnecting short lived clients.
+    :return: Whether every message of the long lived clients came back exactly once, and the hub forgot every short lived client.
+    """
+    IntercomServer.PORT = port
+    counter = DeliveryCounter()
+    IntercomServer.received_message_from_server.connect(counter.on_message)
+
+    hub = IntercomServer()
+    hub.start_server(discoverable=False)
+    time.sleep(0.2)
+
+    nodes = [IntercomServer() for _ in range(clients)]
+    connectors = [Thread(target=node.start_client, args=[IntercomServer.LOCALHOST]) for node in nodes]
+    for t in connectors:
+        t.start()
+    for t in connectors:
+        t.join()
+    if not wait_until(lambda: len(hub._clients) == clients and all(node.is_running() for node in nodes), timeout):
+        print(f"Only {len(hub._clients)} of {clients} clients connected", file=sys.stderr)
+        return False
+
+    stop_churn = [False]
+
+    def send(node: IntercomServer, tag: str) -> None:
+        for i in range(messages):
+            node.send_data({"stress": tag, "i": i}, IntercomServer.LOCALHOST)
+
+    def churn() -> None:
+        while not stop_churn[0]:
+            node = IntercomServer()
+            node.start_client(IntercomServer.LOCALHOST)
+            if wait_until(node.is_running, timeout):
+                for i in range(10):
+                    node.send_data({"i": i}, IntercomServer.LOCALHOST)
+            node.disconnect()
+            wait_until(lambda: not node.is_running(), timeout)
+
+    start = time.perf_counter()
+    churn_threads = [Thread(target=churn) for _ in range(churners)]
+    send_threads = [Thread(target=send, args=[node, f"{n}"]) for n, node in enumerate(nodes) for _ in range(senders)]
+    for t in churn_threads + send_threads:
+        t.start()
+    for t in send_threads:
+        t.join()
+
+    expected = senders * messages
+    delivered = wait_until(lambda: all(counter.received[f"{n}"] >= expected for n in range(clients)), timeout)
+    elapsed = time.perf_counter() - start
+    stop_churn[0] = True
+    for t in churn_threads:
+        t.join()
+    forgot_churned = wait_until(lambda: len(hub._clients) == clients, timeout)
+
+    total = sum(counter.received.values())
+    print(f"{clients} clients x {senders} threads x {messages} messages, {churners} churning threads: {total}/{clients * expected} delivered in {elapsed:.2f} s ({total / elapsed:.0f} msgs/s)")
+    exact = all(counter.received[f"{n}"] == expected for n in range(clients))
+    if not delivered or not exact:
+        print(f"Lost or duplicated messages, per client: {dict(counter.received)}", file=sys.stderr)
+    if not forgot_churned:
+        print(f"Hub still holds {len(hub._clients)} clients, expected {clients}", file=sys.stderr)
+
+    for node in nodes:
+        node.disconnect()
+    return delivered and exact and forgot_churned
+
+
+if __name__ == "__main__":
+    # Run from the repository root as `python -m helpers.generic.network_stress [port]`
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 17091
+    print(f"Send queue, 8 producers: SimpleQueue {queue_throughput(SimpleQueue()):,.0f} items/s | locked deque {queue_throughput(LockedQueue()):,.0f} items/s")
+    print(f"Client registry, 8 readers and a churning writer: copy-on-write {registry_throughput(ClientRegistry()):,.0f} snapshots/s | locked copy {registry_throughput(LockedRegistry()):,.0f} snapshots/s")
+    ok = stress(port)
+    print("OK" if ok else "FAILED")
+    # The hub's accept loop cannot be stopped, so exit without joining it
+    os._exit(0 if ok else 1)
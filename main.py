@@ -2,17 +2,18 @@ import yaml
 import json
 import plac
 import subprocess
-import time
 from helpers.generic.functions import *
 from typing import Optional
 from shutil import which
 from typing import Callable
 from plac import opt
+from plac import flg
 import logging as log
-from threading import Thread
 
 from py_intercom.intercom import Intercom
-from py_intercom.command.command_manager import CommandManager
+from py_intercom.relay import IntercomRelay
+from py_intercom.command.dispatch_table import DispatchTable
+from py_intercom.command.timer_wheel import TimerWheel
 
 from piney_event.event import TypedEvent
 from piney_event.event import Event
@@ -44,51 +45,29 @@ class App:
         plac.call(self._main)
 
     def __init__(self) -> None:
-        self.intercom: Optional[Intercom] = None
+        self.intercom: Optional[Intercom | IntercomRelay] = None
         self.commands_extension: Optional[type | object] = None
+        self._dispatch_table: DispatchTable = DispatchTable({"CommandsInterface": CommandsInterface})
 
     def set_extension(self, handler: type | object) -> None:
         """
         :param handler: Commands starting with the `CommandsExtension` callback will be forwarded to `handler`, ideally provide as `type` (class name) for static method usage, or as `object` for member funtion usage.
         """
         self.commands_extension = handler
+        self._dispatch_table.set_namespace("CommandsExtension", handler)
 
-    def _on_command_requested(self, command_id: str, language: str, command_map: dict) -> None:
-        command = command_map[language][command_id]
-        callback_id = command["callback"]
-        if not callback_id.startswith("CommandsInterface.") and not callback_id.startswith("CommandsExtension."):
-            return
-
-        _ci, func = callback_id.split(".")
-        cb = None
-        try:
-            cb = getattr(CommandsInterface, func)
-        except:
-            if not self.commands_extension:
-                return
-
-            try:
-                cb = getattr(self.commands_extension, func)
-            except:
-                return
-
-        args = command["args"] if "args" in command else []
-        kwargs = command["kwargs"] if "kwargs" in command else {}
-        
-        ret = cb(command, *args, **kwargs)
+    def _on_command_requested(self, command_id: str, language: str, command_map: dict) -> Optional[str]:
+        ret = self._dispatch_table.dispatch(command_id, language, command_map)
         if ret:
             log.info(f"Command {command_id} returned prompt '{ret}'")
-            CommandManager.say = ret
+        return ret
 
     @staticmethod
-    def deferred_call(method: Callable, time_defer_secs: float, args: list = [], kwargs: dict = {}) -> None:
-        t = Thread(target=App._deferred_call_thread, args=[method, time_defer_secs, args, kwargs])
-        t.start()
-
-    @staticmethod
-    def _deferred_call_thread(method: Callable, time_defer_secs: float, args: list = [], kwargs: dict = {}) -> None:
-        time.sleep(time_defer_secs)
-        method(*args, **kwargs)
+    def deferred_call(method: Callable, time_defer_secs: float, args: list = [], kwargs: dict = {}) -> TimerWheel.Timer:
+        """
+        Calls `method` on the shared `TimerWheel` thread after `time_defer_secs` seconds, it should return quickly.
+        """
+        return TimerWheel.shared().call_later(time_defer_secs, method, *args, **kwargs)
 
     def _on_set_language_requested(self, language: str) -> None:
         if not self.intercom:
@@ -98,7 +77,8 @@ class App:
 
     @opt("config_file", abbrev="C")
     @opt("commands_file", abbrev="c")
-    def _main(self, config_file: str = "config.yml", commands_file: str = "commands.json") -> int:
+    @flg("daemon", abbrev="d", help="Run as a headless relay that only executes commands received over the network, without voice, TTS or LLM.")
+    def _main(self, config_file: str = "config.yml", commands_file: str = "commands.json", daemon: bool = False) -> int:
         config = {}
         with open(config_file, "r") as f:
             config = yaml.safe_load(f)
@@ -118,16 +98,20 @@ class App:
             log.error(f"Could not read commands file at `{config_file}`")
             return -1
 
-        self.intercom = Intercom(config, command_map)
+        self._dispatch_table.compile(command_map)
+        if daemon:
+            self.intercom = IntercomRelay(config, command_map)
+        else:
+            self.intercom = Intercom(config, command_map)
 
-        self.intercom.command_requested.connect(self._on_command_requested)
+        self.intercom.set_command_dispatcher(self._on_command_requested)
         CommandsInterface.set_language_requested.connect(self._on_set_language_requested)
         CommandsInterface.shut_off.connect(self.intercom.stop_main_loop)
 
         self.intercom.start_main_loop()
         while self.intercom._main_loop and self.intercom._main_loop.is_alive():
             try:
-                pass
+                self.intercom._main_loop.join(1.0)
             except KeyboardInterrupt:
                 self.intercom.stop_main_loop()
                 break
@@ -0,0 +1,153 @@
+import logging as log
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from threading import BoundedSemaphore, Lock
+from py_intercom.command.timer_wheel import TimerWheel
+
+
+class CommandExecutor:
+    """
+    Runs command callbacks on a bounded thread pool, off the threads that requested them.
+
+    At most `max_workers` commands run at once and `max_pending` more may wait for a worker, further submissions are rejected.
+    A command that runs longer than its timeout, counted from when a worker starts it, has its future failed with `TimeoutError`. Time spent waiting for a worker does not count, so queued commands always run.
+    Python threads cannot be killed, so the callback itself keeps its worker until it returns.
+    """
+    def __init__(self, max_workers: int = 4, max_pending: int = 16, default_timeout: Optional[float] = 30.0, timer_wheel: Optional[TimerWheel] = None):
+        """
+        :param default_timeout: Seconds a command may run before it is considered timed out, if it does not set its own. None for no timeout.
+        :param timer_wheel: Schedules the timeouts, `TimerWheel.shared()` if None.
+        """
+        self._pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers, thread_name_prefix="command")
+        self._slots: BoundedSemaphore = BoundedSemaphore(max_workers + max_pending)
+        self._default_timeout: Optional[float] = default_timeout
+        self._timer_wheel: TimerWheel = timer_wheel if timer_wheel else TimerWheel.shared()
+
+        self._running_lock: Lock = Lock()
+        self._running: dict[str, int] = {}
+
+    @staticmethod
+    def from_config(config: dict) -> 'CommandExecutor':
+        """
+        :param config: The `commands` section of the config.
+        """
+        return CommandExecutor(
+            config["max_workers"] if "max_workers" in config else 4,
+            config["max_pending"] if "max_pending" in config else 16,
+            config["default_timeout"] if "default_timeout" in config else 30.0
+        )
+
+    def submit(self, name: str, callback: Callable[..., Any], *args, timeout: Optional[float] = None, max_concurrent: Optional[int] = None, **kwargs) -> Optional[Future]:
+        """
+        :param name: Identifies the command in logs and for `max_concurrent`.
+        :param timeout: Overrides the default timeout for this call.
+        :param max_concurrent: How many calls with the same `name` may be queued or running at once, None for no limit.
+        :return: A future for the callback's return value, or None if the call was rejected.
+        """
+        if not self._slots.acquire(blocking=False):
+            log.error(f"Rejected command `{name}` as too many commands are pending")
+            return None
+
+        with self._running_lock:
+            running = self._running[name] if name in self._running else 0
+            if max_concurrent is not None and running >= max_concurrent:
+                self._slots.release()
+                log.error(f"Rejected command `{name}` as {running} calls of it are already pending")
+                return None
+            self._running[name] = running + 1
+
+        result: Future = Future()
+        timeout = timeout if timeout is not None else self._default_timeout
+
+        try:
+            queued = self._pool.submit(self._run, name, result, timeout, callback, args, kwargs)
+        except RuntimeError as e:
+            # The pool was shut down
+            log.error(f"Rejected command `{name}` | {e}")
+            self._finish(name, None)
+            return None
+        queued.add_done_callback(lambda q: self._on_dropped(name, result) if q.cancelled() else None)
+        return result
+
+    def submit_command(self, command_id: str, language: str, command_map: dict[str,dict[str,dict]], dispatcher: Callable[[str, str, dict], Optional[str]], on_result: Optional[Callable[[str], None]] = None) -> Optional[Future]:
+        """
+        Submits `dispatcher(command_id, language, command_map)`, with the `timeout` and `max_concurrent` the command sets, if any.
+        :param on_result: Called with the text the command returned once it finishes, if it returned any.
+        :return: A future for the text the command returned, or None if the call was rejected.
+        """
+        command = command_map[language][command_id]
+        future = self.submit(
+            command_id, dispatcher, command_id, language, command_map,
+            timeout=command["timeout"] if "timeout" in command else None,
+            max_concurrent=command["max_concurrent"] if "max_concurrent" in command else None
+        )
+        if future and on_result:
+            future.add_done_callback(lambda f: self._on_command_done(command_id, f, on_result))
+        return future
+
+    @staticmethod
+    def _on_command_done(command_id: str, future: Future, on_result: Callable[[str], None]) -> None:
+        if future.cancelled() or future.exception():
+            return
+        say = future.result()
+        if say:
+            try:
+                on_result(say)
+            except Exception as e:
+                log.error(f"Got exception handling the result of command `{command_id}` | {e}")
+
+    def _on_dropped(self, name: str, result: Future) -> None:
+        log.info(f"Dropped queued command `{name}` on shutdown")
+        result.cancel()
+        self._finish(name, None)
+
+    def _run(self, name: str, result: Future, timeout: Optional[float], callback: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        timer = None
+        try:
+            if result.done():
+                # Cancelled while waiting for a worker
+                return
+            # Started here, so the timeout counts the time the command runs and not the time it waited for a worker
+            timer = self._timer_wheel.call_later(timeout, self._on_timeout, name, result, timeout) if timeout is not None else None
+            try:
+                value = callback(*args, **kwargs)
+            except Exception as e:
+                log.error(f"Command `{name}` raised | {e}")
+                self._set(result, exception=e)
+            else:
+                self._set(result, value=value)
+        finally:
+            self._finish(name, timer)
+
+    def _finish(self, name: str, timer: Optional[TimerWheel.Timer]) -> None:
+        if timer:
+            timer.cancel()
+        with self._running_lock:
+            self._running[name] -= 1
+            if self._running[name] == 0:
+                del self._running[name]
+        self._slots.release()
+
+    def _on_timeout(self, name: str, result: Future, timeout: float) -> None:
+        if self._set(result, exception=TimeoutError(f"Command `{name}` did not finish within {timeout} seconds")):
+            log.error(f"Command `{name}` timed out after {timeout} seconds")
+
+    @staticmethod
+    def _set(result: Future, value: Any = None, exception: Optional[BaseException] = None) -> bool:
+        """
+        :return: False if `result` was already completed, by a timeout, cancellation or the callback.
+        """
+        try:
+            if exception:
+                result.set_exception(exception)
+            else:
+                result.set_result(value)
+            return True
+        except InvalidStateError:
+            return False
+
+    def shutdown(self) -> None:
+        """
+        Rejects new commands and drops the queued ones, running ones are left to finish.
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,16 +1,25 @@
 from typing import Optional
 from py_intercom.command.keyword_parser import KeywordParser
+from py_intercom.command.fuzzy_keyword_parser import FuzzyKeywordParser
+from py_intercom.command.language_detector import order_languages
 from piney_event.event import TypedEvent
 import logging as log
 
 class CommandManager:
     callback_requested: TypedEvent = TypedEvent(str, str, dict)
-    say: Optional[str] = None
 
-    def __init__(self, command_map: dict={}):
+    def __init__(self, command_map: dict={}, parser_type: type[KeywordParser | FuzzyKeywordParser] = KeywordParser):
+        """
+        :param parser_type: How prompts are matched against triggers, `KeywordParser` for substrings or `FuzzyKeywordParser` for typo tolerant whole tokens.
+        """
         self._command_map: dict[str,dict[str,dict]] = {}
-        self._parser_map: dict[str,KeywordParser] = {}
+        self._parser_type: type[KeywordParser | FuzzyKeywordParser] = parser_type
+        self._parser_map: dict[str,KeywordParser | FuzzyKeywordParser] = {}
         self.set_command_map(command_map)
+
+    def set_parser_type(self, parser_type: type[KeywordParser | FuzzyKeywordParser]) -> None:
+        self._parser_type = parser_type
+        self._parser_map = {language: parser_type(parser.get_keyword_maps()) for language, parser in self._parser_map.items()}
         
     def set_command_map(self, command_map: dict[str,dict[str,dict]]) -> None:
         self._command_map = command_map
@@ -19,7 +28,7 @@ class CommandManager:
             minimal = {}
             for command_id in command_map[language].keys():
                 minimal[command_id] = command_map[language][command_id].pop("triggers")
-            self._parser_map[language] = KeywordParser(minimal)
+            self._parser_map[language] = self._parser_type(minimal)
 
     def get_command_map(self) -> dict[str,dict[str,dict]]:
         return self._command_map
@@ -32,26 +41,40 @@ class CommandManager:
             log.debug(f"Command map: `{self._command_map}`")
             return msg
 
-        CommandManager.say = None
-
         CommandManager.callback_requested.emit(command_id, language, self._command_map)
 
-        if CommandManager.say:
-            return CommandManager.say
-
         return f"Command {command_id} executed."
     
+    def parse(self, prompt: str, language: str, any_language: bool = False) -> Optional[tuple[str, str]]:
+        """
+        :param any_language: Whether to match the prompt against the triggers of every language, tried in the order `order_languages` guesses from the prompt's script, instead of only `language`'s.
+        :return: The found `(command_id, language)`, or None.
+        """
+        if any_language:
+            languages = order_languages(prompt, list(self._parser_map.keys()), language)
+        elif language in self._parser_map:
+            languages = [language]
+        else:
+            log.error(f"Current language `{language}` is not added in CommandManager")
+            return None
+
+        log.debug(f"Attempting to parse prompt `{prompt}` for commands in {languages}.")
+        for candidate in languages:
+            found = self._parser_map[candidate].parse(prompt)
+            if found:
+                return (found, candidate)
+
+        return None
+    
     def parse_and_execute(self, prompt: str, language: str) -> Optional[str]:
         if language not in self._command_map:
             log.error(f"Current language `{language}` is not added in CommandManager")
             return None
 
-        # breakpoint()
-        log.debug(f"Attempting to parse prompt `{prompt}` for commands.")
-        found = self._parser_map[language].parse(prompt)
+        found = self.parse(prompt, language)
         if found:
-            log.debug(f"Found command `{found}`. Executing...")
-            return self.execute(found, language)
+            log.debug(f"Found command `{found[0]}`. Executing...")
+            return self.execute(found[0], language)
 
         log.debug(f"No command found")
         return None
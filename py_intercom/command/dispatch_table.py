@@ -0,0 +1,69 @@
+import logging as log
+from functools import partial
+from typing import Any, Callable, Optional
+
+
+class DispatchTable:
+    """
+    Resolves the `callback` of every command in a command map once, to a callable bound to the command and its `args` / `kwargs`.
+
+    Callbacks are written as `Namespace.function`, where `Namespace` is one of the keys of `namespaces`.
+    The table is replaced as a whole when it changes, so dispatching needs no locking.
+    """
+    def __init__(self, namespaces: dict[str, type | object]):
+        """
+        :param namespaces: Maps the prefix of a `callback` to the class or object its functions are looked up on.
+        """
+        self._namespaces: dict[str, type | object] = namespaces
+        # (language, command_id) -> (the command it was compiled from, the bound callback or None if it has no known callback)
+        self._table: dict[tuple[str, str], tuple[dict, Optional[Callable[[], Any]]]] = {}
+
+    def set_namespace(self, name: str, handler: type | object) -> None:
+        self._namespaces = {**self._namespaces, name: handler}
+        self._table = {key: (command, self._compile_command(command)) for key, (command, _bound) in self._table.items()}
+
+    def compile(self, command_map: dict[str,dict[str,dict]]) -> None:
+        table: dict[tuple[str, str], tuple[dict, Optional[Callable[[], Any]]]] = {}
+        for language in command_map.keys():
+            for command_id, command in command_map[language].items():
+                table[(language, command_id)] = (command, self._compile_command(command))
+        self._table = table
+
+    def _compile_command(self, command: dict) -> Optional[Callable[[], Any]]:
+        callback_id = command["callback"] if "callback" in command else ""
+        namespace, _sep, func = callback_id.partition(".")
+        if namespace not in self._namespaces or not func:
+            return None
+
+        callback = getattr(self._namespaces[namespace], func, None)
+        if not callable(callback):
+            log.error(f"Callback `{callback_id}` could not be resolved")
+            return None
+
+        args = tuple(command["args"]) if "args" in command else ()
+        kwargs = dict(command["kwargs"]) if "kwargs" in command else {}
+        return partial(callback, command, *args, **kwargs)
+
+    def lookup(self, command_id: str, language: str, command_map: dict[str,dict[str,dict]]) -> Optional[Callable[[], Any]]:
+        """
+        Commands missing from the table, or that differ from the compiled ones (e.g. received from a node with another command map), are compiled on the spot and cached.
+        :return: The command's callback bound to its arguments, None if it has no callback in any of the namespaces.
+        """
+        command = command_map[language][command_id]
+        key = (language, command_id)
+        entry = self._table.get(key)
+        if entry is not None and (entry[0] is command or entry[0] == command):
+            return entry[1]
+
+        bound = self._compile_command(command)
+        self._table = {**self._table, key: (command, bound)}
+        return bound
+
+    def dispatch(self, command_id: str, language: str, command_map: dict[str,dict[str,dict]]) -> Optional[str]:
+        """
+        :return: What the command's callback returned, None if it has no callback in any of the namespaces.
+        """
+        bound = self.lookup(command_id, language, command_map)
+        if not bound:
+            return None
+        return bound()
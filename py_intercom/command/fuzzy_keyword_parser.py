@@ -0,0 +1,198 @@
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from typing import Optional
+
+# Hebrew final letter forms, mapped to their regular forms
+HEBREW_FINALS: dict[int, str] = {ord("ך"): "כ", ord("ם"): "מ", ord("ן"): "נ", ord("ף"): "פ", ord("ץ"): "צ"}
+# Hebrew one letter prefixes (and, the, in, as, to, from, that), written attached to the following word
+HEBREW_PREFIXES: str = "ובהכלמש"
+TOKEN_PATTERN: re.Pattern = re.compile(r"\w+")
+# Tokens up to this long only tolerate a swap of adjacent letters, as changing one of their letters too often makes another word (`turn` and `burn`, `shut` and `shot`)
+SWAP_ONLY_LENGTH: int = 5
+
+
+def normalize(text: str) -> str:
+    """
+    Case folds `text`, strips combining marks (Hebrew niqqud and cantillation, latin accents) and maps Hebrew final letters to their regular forms.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+    return stripped.translate(HEBREW_FINALS)
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def max_distance(token: str) -> int:
+    """
+    :return: The edit distance tolerated when matching `token`, short words must match exactly.
+    """
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 7:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    :return: The edit distance between `a` and `b`, counting a swap of adjacent letters as one edit, or `limit + 1` once it is known to exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous: list[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def is_adjacent_swap(a: str, b: str) -> bool:
+    """
+    :return: Whether `b` is `a` with two adjacent letters swapped.
+    """
+    if len(a) != len(b):
+        return False
+    diff = [i for i in range(len(a)) if a[i] != b[i]]
+    return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+
+
+def bigrams(token: str) -> set[str]:
+    padded = f"^{token}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class FuzzyKeywordParser:
+    """
+    Drop-in replacement for `KeywordParser` that matches whole tokens instead of substrings, so `off` does not match `offer`.
+
+    Trigger tokens tolerate a few typos (see `max_distance` and `SWAP_ONLY_LENGTH`), found through a character bigram index over all trigger tokens.
+    Every word of a trigger must be found in the prompt, in any order. A multi word trigger phrase must be found as consecutive tokens.
+    When several triggers match, the one with the most tokens wins, so `turn off the computer now` is not taken for `turn off`.
+    Hebrew one letter prefixes are split off prompt tokens, so `ל` and `אנגלית` are both found in `לאנגלית`.
+    """
+    def __init__(self, keyword_maps: dict[str,list[list[str]]], cache_size: int = 4096):
+        """
+        :param cache_size: How many distinct prompt tokens to remember the resolved trigger tokens of.
+        """
+        self._cache_size: int = cache_size
+        self._keyword_maps: dict[str,list[list[str]]] = {}
+        self.set_keyword_maps(keyword_maps)
+
+    def set_keyword_maps(self, keyword_maps: dict[str,list[list[str]]]) -> None:
+        self._keyword_maps = keyword_maps
+
+        # Every trigger, in priority order, as its command and the token sequences of its words
+        self._triggers: list[tuple[str, tuple[tuple[str, ...], ...]]] = []
+        # Trigger token -> indices of the triggers using it
+        self._token_triggers: dict[str, set[int]] = {}
+        for command_id in keyword_maps.keys():
+            for trigger in keyword_maps[command_id]:
+                words = tuple(tuple(tokenize(tw)) for tw in trigger)
+                words = tuple(w for w in words if w)
+                if not words:
+                    continue
+                index = len(self._triggers)
+                self._triggers.append((command_id, words))
+                for word in words:
+                    for token in word:
+                        self._token_triggers.setdefault(token, set()).add(index)
+
+        self._gram_index: dict[str, set[str]] = {}
+        # Trigger token -> how many distinct bigrams it has, fewer than one per letter when some repeat, as in `banana`
+        self._gram_counts: dict[str, int] = {}
+        for token in self._token_triggers.keys():
+            if max_distance(token) == 0:
+                continue
+            grams = bigrams(token)
+            self._gram_counts[token] = len(grams)
+            for gram in grams:
+                self._gram_index.setdefault(gram, set()).add(token)
+
+        self._resolve = lru_cache(maxsize=self._cache_size)(self._resolve_uncached)
+
+    def get_keyword_maps(self) -> dict[str,list[list[str]]]:
+        return self._keyword_maps
+
+    def _resolve_uncached(self, token: str) -> frozenset[str]:
+        """
+        :return: The trigger tokens `token` matches, exactly or within their tolerated edit distance.
+        """
+        matches = {token} if token in self._token_triggers else set()
+
+        # How many distinct bigrams every trigger token shares with `token`
+        token_grams = bigrams(token)
+        shared = Counter(chain.from_iterable(self._gram_index[gram] for gram in token_grams if gram in self._gram_index))
+
+        for candidate, count in shared.items():
+            limit = max_distance(candidate)
+            # Every edit (a swap included) removes at most 3 distinct bigrams from either token
+            if candidate in matches or count < max(len(token_grams), self._gram_counts[candidate]) - 3 * limit:
+                continue
+            if len(candidate) <= SWAP_ONLY_LENGTH:
+                if is_adjacent_swap(token, candidate):
+                    matches.add(candidate)
+            elif edit_distance(token, candidate, limit) <= limit:
+                matches.add(candidate)
+
+        return frozenset(matches)
+
+    def _prompt_positions(self, prompt: str) -> list[set[str]]:
+        """
+        :return: For every token of the prompt, the trigger tokens found at its position.
+        """
+        positions = []
+        for token in tokenize(prompt):
+            variants = [token]
+            # Split off up to two Hebrew prefixes, e.g. `ולאנגלית` -> `לאנגלית`, `אנגלית`, `ו`, `ל`
+            rest = token
+            while len(variants) < 5 and len(rest) > 2 and rest[0] in HEBREW_PREFIXES:
+                variants.append(rest[0])
+                rest = rest[1:]
+                variants.append(rest)
+
+            found: set[str] = set()
+            for variant in variants:
+                found |= self._resolve(variant)
+            positions.append(found)
+        return positions
+
+    @staticmethod
+    def _word_found(word: tuple[str, ...], positions: list[set[str]]) -> bool:
+        for start in range(len(positions) - len(word) + 1):
+            if all(word[k] in positions[start + k] for k in range(len(word))):
+                return True
+        return False
+
+    def parse(self, prompt: str) -> Optional[str]:
+        positions = self._prompt_positions(prompt)
+
+        candidates: set[int] = set()
+        for found in positions:
+            for token in found:
+                candidates |= self._token_triggers[token]
+
+        best: Optional[tuple[int, int]] = None
+        for index in candidates:
+            words = self._triggers[index][1]
+            if not all(self._word_found(word, positions) for word in words):
+                continue
+            # Most tokens first, then the trigger listed first
+            rank = (-sum(len(word) for word in words), index)
+            if best is None or rank < best:
+                best = rank
+
+        return self._triggers[best[1]][0] if best else None
+
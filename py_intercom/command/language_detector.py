@@ -0,0 +1,62 @@
+from typing import Optional
+
+# Letter ranges of the scripts we tell apart, as (first, last) codepoints
+SCRIPT_RANGES: dict[str, list[tuple[int, int]]] = {
+    "hebrew": [(0x0590, 0x05FF), (0xFB1D, 0xFB4F)],
+    "arabic": [(0x0600, 0x06FF), (0x0750, 0x077F)],
+    "cyrillic": [(0x0400, 0x04FF)],
+    "greek": [(0x0370, 0x03FF)],
+    "latin": [(0x0041, 0x005A), (0x0061, 0x007A), (0x00C0, 0x024F)],
+}
+
+# Language prefixes (as in `he_IL`) written in a script other than latin
+LANGUAGE_SCRIPTS: dict[str, str] = {
+    "he": "hebrew",
+    "iw": "hebrew",
+    "yi": "hebrew",
+    "ar": "arabic",
+    "fa": "arabic",
+    "ru": "cyrillic",
+    "uk": "cyrillic",
+    "bg": "cyrillic",
+    "el": "greek",
+}
+
+
+def language_script(language: str) -> str:
+    prefix = language.split("_")[0].split("-")[0].lower()
+    return LANGUAGE_SCRIPTS[prefix] if prefix in LANGUAGE_SCRIPTS else "latin"
+
+
+def dominant_script(text: str) -> Optional[str]:
+    """
+    :return: The script most letters of `text` are written in, None if it has no letters of a known script.
+    """
+    counts: dict[str, int] = {}
+    for char in text:
+        codepoint = ord(char)
+        if codepoint < 0x41:
+            continue
+        for script, ranges in SCRIPT_RANGES.items():
+            if any(first <= codepoint <= last for first, last in ranges):
+                counts[script] = (counts[script] if script in counts else 0) + 1
+                break
+
+    if not counts:
+        return None
+    return max(counts, key=lambda script: counts[script])
+
+
+def order_languages(text: str, languages: list[str], current: str) -> list[str]:
+    """
+    :return: `languages` ordered by how likely `text` is in them: the ones written in the script of `text` first, then `current`, then the rest, in their original order.
+    """
+    script = dominant_script(text)
+
+    def rank(language: str) -> int:
+        matches_script = script is not None and language_script(language) == script
+        if matches_script:
+            return 0 if language == current else 1
+        return 2 if language == current else 3
+
+    return sorted(languages, key=rank)
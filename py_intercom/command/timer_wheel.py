@@ -0,0 +1,145 @@
+import logging as log
+import math
+import time
+from typing import Any, Callable, Optional
+from threading import Thread, Condition
+
+
+class TimerWheel:
+    """
+    Runs delayed calls on a single thread, using a hashed timer wheel.
+
+    Timers land in the slot of their deadline tick. The thread sleeps until the earliest pending deadline, then only visits the slots of the elapsed ticks, and never wakes up while no timer is pending.
+    Callbacks run on the wheel's thread, so they should return quickly and hand long work off to a `CommandExecutor`.
+    """
+    _shared: Optional['TimerWheel'] = None
+    _shared_condition: Condition = Condition()
+
+    class Timer:
+        def __init__(self, wheel: 'TimerWheel', deadline_tick: int, callback: Callable[..., Any], args: tuple, kwargs: dict):
+            self.wheel: TimerWheel = wheel
+            self.deadline_tick: int = deadline_tick
+            self.callback: Callable[..., Any] = callback
+            self.args: tuple = args
+            self.kwargs: dict = kwargs
+            self.cancelled: bool = False
+            # Whether the timer is still in its slot, waiting for its deadline
+            self.scheduled: bool = True
+
+        def cancel(self) -> None:
+            self.wheel._cancel(self)
+
+    @staticmethod
+    def shared() -> 'TimerWheel':
+        """
+        :return: The process wide wheel, created on first use.
+        """
+        with TimerWheel._shared_condition:
+            if not TimerWheel._shared:
+                TimerWheel._shared = TimerWheel()
+            return TimerWheel._shared
+
+    def __init__(self, tick: float = 0.01, slots: int = 512):
+        """
+        :param tick: The wheel's resolution in seconds, timers fire up to one tick late, never early.
+        :param slots: The amount of slots, timers further than `tick * slots` seconds stay in their slot for more than one turn.
+        """
+        self._tick: float = tick
+        self._slots: int = slots
+        self._wheel: list[list[TimerWheel.Timer]] = [[] for _ in range(slots)]
+        self._start: float = time.monotonic()
+        self._next_tick: int = 0
+        self._pending: int = 0
+
+        self._condition: Condition = Condition()
+        self._thread: Optional[Thread] = None
+
+    def _now_tick(self) -> int:
+        return int((time.monotonic() - self._start) / self._tick)
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args, **kwargs) -> 'TimerWheel.Timer':
+        """
+        Calls `callback(*args, **kwargs)` on the wheel's thread after `delay` seconds.
+        :return: A timer that can be cancelled until it fires.
+        """
+        with self._condition:
+            if not self._thread or not self._thread.is_alive():
+                self._thread = Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+            now = time.monotonic() - self._start
+            if self._pending == 0:
+                # Skip the ticks that elapsed while the wheel was idle instead of visiting them
+                self._next_tick = int(now / self._tick)
+            deadline_tick = max(math.ceil((now + delay) / self._tick), self._next_tick)
+            timer = TimerWheel.Timer(self, deadline_tick, callback, args, kwargs)
+            self._wheel[deadline_tick % self._slots].append(timer)
+            self._pending += 1
+            self._condition.notify()
+            return timer
+
+    def _cancel(self, timer: 'TimerWheel.Timer') -> None:
+        with self._condition:
+            timer.cancelled = True
+            if not timer.scheduled:
+                return
+            timer.scheduled = False
+            self._wheel[timer.deadline_tick % self._slots].remove(timer)
+            self._pending -= 1
+            # The loop may be sleeping until this timer's deadline
+            self._condition.notify()
+
+    def _earliest_tick(self) -> int:
+        """
+        :return: The earliest deadline tick of the pending timers, must be called holding `_condition` while some are pending.
+        """
+        for tick in range(self._next_tick, self._next_tick + self._slots):
+            for timer in self._wheel[tick % self._slots]:
+                if timer.deadline_tick == tick:
+                    return tick
+        # Every pending timer is more than a turn of the wheel away
+        return min(timer.deadline_tick for slot in self._wheel for timer in slot)
+
+    def _collect_due(self, now_tick: int) -> list['TimerWheel.Timer']:
+        """
+        Takes the timers due by `now_tick` out of their slots, visiting every slot at most once.
+        """
+        due = []
+        for tick in range(self._next_tick, min(now_tick, self._next_tick + self._slots - 1) + 1):
+            index = tick % self._slots
+            if not self._wheel[index]:
+                continue
+            remaining = []
+            for timer in self._wheel[index]:
+                if timer.deadline_tick <= now_tick:
+                    timer.scheduled = False
+                    due.append(timer)
+                else:
+                    remaining.append(timer)
+            self._wheel[index] = remaining
+        self._next_tick = now_tick + 1
+        self._pending -= len(due)
+        return due
+
+    def _loop(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending == 0:
+                    self._condition.wait()
+
+                earliest_tick = self._earliest_tick()
+                wait = self._start + earliest_tick * self._tick - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                # No timer is due in the ticks before the earliest deadline, skip their slots
+                self._next_tick = earliest_tick
+                due = self._collect_due(self._now_tick())
+
+            for timer in due:
+                if timer.cancelled:
+                    continue
+                try:
+                    timer.callback(*timer.args, **timer.kwargs)
+                except Exception as e:
+                    log.error(f"Got exception in timer callback `{timer.callback}` | {e}")
@@ -1,21 +1,31 @@
 import logging as log
-from time import sleep
-from typing import Optional
+from typing import Callable, Optional, TYPE_CHECKING
+from concurrent.futures import Future
 from threading import Thread
 from threading import Event as Flag
 from py_intercom.networking.intercom_server import IntercomServer
-from py_intercom.tts.tts_wrapper import TTSWrapper
-from py_intercom.voice.voice_parser import VoiceParser 
 from py_intercom.command.command_manager import CommandManager
-from py_intercom.llm.llm import LLM
+from py_intercom.command.command_executor import CommandExecutor
+from py_intercom.command.fuzzy_keyword_parser import FuzzyKeywordParser
 from piney_event.event import TypedEvent
 
+# Speech recognition, TTS and the LLM SDKs are slow to import, so they are only imported by the nodes that use them, see `Intercom.__init__`
+if TYPE_CHECKING:
+    from py_intercom.tts.tts_wrapper import TTSWrapper
+    from py_intercom.voice.voice_parser import VoiceParser
+    from py_intercom.llm.llm import LLM
+
 class Intercom:
-    def __init__(self, config: dict, command_map: dict[str,dict[str,dict]], voice_parser: Optional[VoiceParser] = None, command_manager: CommandManager = CommandManager({})):
+    def __init__(self, config: dict, command_map: dict[str,dict[str,dict]], voice_parser: Optional['VoiceParser'] = None, command_manager: CommandManager = CommandManager({})):
         self.command_requested: TypedEvent = TypedEvent(str, str, dict)
 
         self._config: dict = config
         self._language: str = self._config["intercom"]["default_language"]
+        self._auto_detect_language: bool = self._config["intercom"]["auto_detect_language"] if "auto_detect_language" in self._config["intercom"] else False
+        self._command_dispatcher: Optional[Callable[[str, str, dict], Optional[str]]] = None
+        self._command_executor: CommandExecutor = CommandExecutor.from_config(self._config["commands"] if "commands" in self._config else {})
+        # The last command requested by voice on this node, the main loop waits for it so its reply is said before listening again
+        self._local_command: Optional[Future] = None
 
         self._is_networked: bool = self._config["networking"]["is_networked"] if "networking" in self._config and "is_networked" in self._config["networking"] else False
         self._server_ip: Optional[str] = None
@@ -24,58 +34,60 @@ class Intercom:
         if self._is_networked:
             self._server_manager = IntercomServer()
             self._is_server = self._config["networking"]["is_server"] if "is_server" in self._config["networking"] else False
-            if self._is_server:
-                log.info("Starting Intercom server")
-                self._server_ip = self._server_manager.start_server()
-            else:
-                self._server_ip = self._config["networking"]["server_ip"]
-                if IntercomServer.test_connection(self._server_ip):
-                    log.info(f"Server at `{self._server_ip}` is available")
-                else:
-                    raise RuntimeError(f"Could not establish intercom as there is no valid server at `{self._server_ip}`")
-                sleep(1)
-                log.info(f"Starting Intercom client, connecting to ip `{self._server_ip}`")
-                self._server_manager.start_client(self._server_ip)
-
+            self._server_ip = self._server_manager.start_from_config(self._config["networking"])
             self._server_manager.received_message_from_server.connect(self._on_received_message_from_server)
 
-        if voice_parser:
-            self._voice_parser: VoiceParser = voice_parser
-        else:
-            self._voice_parser: VoiceParser = VoiceParser(
-                self._config["voice"]["energy_threshold"],
-                self._config["voice"]["timeout"],
-                self._config["voice"]["phrase_time_limit"],
-                self._config["voice"]["adjust_for_ambient_noise"]
-            )
-
         self._command_manager: CommandManager = command_manager
         self._command_manager.set_command_map(command_map)
+        if "fuzzy_matching" in self._config["intercom"] and self._config["intercom"]["fuzzy_matching"]:
+            self._command_manager.set_parser_type(FuzzyKeywordParser)
         CommandManager.callback_requested.connect(self._on_command_requested)
 
-        llm_type: str = "gemini"
-        conversation_starter: str = "Your name is Intercom. You are an AI assistant."
-        model: Optional[str] = None
-        if "ai" in config:
-            if "type" in config["ai"]:
-                llm_type = config["ai"]["type"]
-            if "conversation_starter" in config["ai"]:
-                conversation_starter = config["ai"]["conversation_starter"]
-            if "model" in config["ai"]:
-                model = config["ai"]["model"]
-
-        t = LLM.Type.from_str(llm_type)
-        self._llm: LLM = LLM(t if t else LLM.Type.GEMINI, conversation_starter, model_name=model)
-        self._llm.start_conversation()
-
-        self._tts: TTSWrapper = TTSWrapper(self._config["tts"])
+        # Networked clients only execute remote commands, the voice loop runs on the server or on standalone nodes
+        self._runs_voice_loop: bool = not self._is_networked or self._is_server
+        self._voice_parser: Optional['VoiceParser'] = None
+        self._llm: Optional['LLM'] = None
+        self._tts: Optional['TTSWrapper'] = None
         self._tts_queue: list[str] = []
 
+        if self._runs_voice_loop:
+            if voice_parser:
+                self._voice_parser = voice_parser
+            else:
+                from py_intercom.voice.voice_parser import VoiceParser
+                self._voice_parser = VoiceParser(
+                    self._config["voice"]["energy_threshold"],
+                    self._config["voice"]["timeout"],
+                    self._config["voice"]["phrase_time_limit"],
+                    self._config["voice"]["adjust_for_ambient_noise"]
+                )
+
+            llm_type: str = "gemini"
+            conversation_starter: str = "Your name is Intercom. You are an AI assistant."
+            model: Optional[str] = None
+            if "ai" in config:
+                if "type" in config["ai"]:
+                    llm_type = config["ai"]["type"]
+                if "conversation_starter" in config["ai"]:
+                    conversation_starter = config["ai"]["conversation_starter"]
+                if "model" in config["ai"]:
+                    model = config["ai"]["model"]
+
+            from py_intercom.llm.llm import LLM
+            t = LLM.Type.from_str(llm_type)
+            self._llm = LLM(t if t else LLM.Type.GEMINI, conversation_starter, model_name=model)
+            self._llm.start_conversation_in_background()
+
+            from py_intercom.tts.tts_wrapper import TTSWrapper
+            self._tts = TTSWrapper(self._config["tts"])
+
         self._main_loop: Optional[Thread] = None
         self._loop_should_stop: Flag = Flag()
         self._loop_should_stop.clear()
 
     def listen_for_prompt(self) -> str:
+        if not self._voice_parser:
+            return ""
         try:
             prompt = self._voice_parser.listen(self._config["intercom"]["activation_keywords"][self._language], self._language)
             if prompt:
@@ -86,12 +98,30 @@ class Intercom:
         return ""
     
     def process_prompt(self, prompt: str) -> Optional[str]:
-        return self._command_manager.parse_and_execute(prompt, self._language)
+        if not self._auto_detect_language:
+            return self._command_manager.parse_and_execute(prompt, self._language)
+
+        found = self._command_manager.parse(prompt, self._language, any_language=True)
+        if not found:
+            log.debug(f"No command found")
+            return None
+
+        command_id, language = found
+        if language != self._language:
+            log.info(f"Detected language `{language}` from command `{command_id}`, switching to it")
+            self.set_language(language)
+        return self._command_manager.execute(command_id, language)
 
     def get_ai_response(self, prompt: str) -> str:
+        if not self._llm:
+            log.error("Cannot get AI response as this node has no LLM.")
+            return ""
         return self._llm.get_response(prompt)
     
     def send_to_tts(self, text: str) -> None:
+        if not self._tts:
+            log.error("Cannot run TTS as this node has no TTS.")
+            return
         log.debug(f"Sending text {text} to TTS")
         self._tts.run(text, self._language)
 
@@ -103,6 +133,7 @@ class Intercom:
     def stop_main_loop(self) -> None:
         log.info("Stopping main loop")
         self._loop_should_stop.set()
+        self._command_executor.shutdown()
     
     def main_loop_thread(self) -> None:
         self._exit_code = 0
@@ -114,6 +145,7 @@ class Intercom:
                 break
             try:
                 if self._is_networked and not self._is_server:
+                    self._loop_should_stop.wait(IntercomServer.POLL_INTERVAL)
                     continue
 
                 while len(self._tts_queue):
@@ -125,9 +157,12 @@ class Intercom:
 
                 log.info(f"Got voice prompt '{prompt}'")
 
+                self._local_command = None
                 command = self.process_prompt(prompt)
-                # This will be handled in the _confirm_command event callback
+                # The command runs on the command executor, its reply is queued here so it is said before listening again
                 if command:
+                    if self._local_command:
+                        self._queue_command_reply(self._local_command)
                     continue
 
                 prompt_prepend = self._config["intercom"]["prompt_prepend"] if "prompt_prepend" in self._config["intercom"] else ""
@@ -148,18 +183,36 @@ class Intercom:
                 self._loop_should_stop.set()
                 raise e
 
-    def _confirm_command(self, command_id: str, language: str, command_map: dict) -> None:
-        CommandManager.say = None
+    def _queue_command_reply(self, future: Future) -> None:
+        """
+        Waits for a command and queues the text it returned for TTS.
+        """
+        try:
+            say = future.result()
+        except Exception as e:
+            log.debug(f"Command did not return a reply | {e}")
+            return
+        if say:
+            self._tts_queue.append(say)
+
+    def _confirm_command(self, command_id: str, language: str, command_map: dict, on_result: Optional[Callable[[str], None]] = None) -> Optional[Future]:
+        """
+        Runs the command on the command executor.
+        :param on_result: Called with the text the command wants said once it finishes, see `CommandExecutor.submit_command`.
+        :return: The future of the text the command wants said, None if it was not run.
+        """
         self.command_requested.emit(command_id, language, command_map)
-        if CommandManager.say:
-            self._tts_queue.append(CommandManager.say)
+        if not self._command_dispatcher:
+            return None
+
+        return self._command_executor.submit_command(command_id, language, command_map, self._command_dispatcher, on_result)
 
     def _on_command_requested(self, command_id: str, language: str, command_map: dict) -> None:
         command = command_map[language][command_id]
         is_networked = command["is_remote"] if "is_remote" in command else False
         if not is_networked or not self._server_manager:
             log.debug(f"Intercom confirmed local command `{command_id}`")
-            self._confirm_command(command_id, language, command_map)
+            self._local_command = self._confirm_command(command_id, language, command_map)
             return
 
         if not "remote_address" in command:
@@ -172,7 +225,7 @@ class Intercom:
 
         local_exec = command["remote_and_local"] if "remote_and_local" in command else False
         if local_exec:
-            self._confirm_command(command_id, language, command_map)
+            self._local_command = self._confirm_command(command_id, language, command_map)
 
         log.info(f"Sending command `{command_id}` to ip `{ip}`")
         self._server_manager.send_data(data, ip, kind="command")
@@ -185,7 +238,13 @@ class Intercom:
         command_id = message.data["command_id"]
         command_map = message.data["command_map"]
         language = message.data["language"]
-        self._confirm_command(command_id, language, command_map)
+        self._confirm_command(command_id, language, command_map, self._tts_queue.append)
+
+    def set_command_dispatcher(self, dispatcher: Callable[[str, str, dict], Optional[str]]) -> None:
+        """
+        :param dispatcher: Executes a confirmed command, called with `(command_id, language, command_map)`, possibly from several threads at once. Returns the text to say, if any.
+        """
+        self._command_dispatcher = dispatcher
 
     def set_language(self, to: str) -> None:
         self._language = to
@@ -1,9 +1,13 @@
 from enum import Enum 
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+from threading import Thread
+from threading import Event as Flag
 import logging as log
 
-from helpers.openai_wrapper import GptWrapper
-from helpers.gemini_wrapper import GeminiWrapper
+# The backends pull in their heavy SDKs, so only the selected one is imported, when the `LLM` is created
+if TYPE_CHECKING:
+    from helpers.openai_wrapper import GptWrapper
+    from helpers.gemini_wrapper import GeminiWrapper
 
 class LLM:
     class Type(Enum):
@@ -25,18 +29,22 @@ class LLM:
         :param model_name: The specific model name, if None default is used. Examples would be `gemini-pro`, `gpt-3.5-turbo`, `gpt-4`, etc.
         """
         self._llm_type: LLM.Type = llm_type
-        self._llm: GeminiWrapper | GptWrapper # Type definition for self._llm
+        self._llm: 'GeminiWrapper | GptWrapper' # Type definition for self._llm
         self._conversation_starter = conversation_starter
         self._model_name = model_name
         self._api_key = api_key
+        self._conversation_started: Flag = Flag()
+        self._conversation_started.set()
 
         if self._llm_type == LLM.Type.GPT:
+            from helpers.openai_wrapper import GptWrapper
             log.info(f"Creating new GPT model")
             if model_name:
                 self._llm = GptWrapper(model=model_name, api_key=api_key)
             else:
                 self._llm = GptWrapper(api_key=api_key)
         if self._llm_type == LLM.Type.GEMINI:
+            from helpers.gemini_wrapper import GeminiWrapper
             log.info(f"Creating new Gemini model")
             if model_name:
                 self._llm = GeminiWrapper(model=model_name, api_key=api_key)
@@ -44,19 +52,36 @@ class LLM:
                 self._llm = GeminiWrapper(api_key=api_key)
 
     def start_conversation(self) -> str:
-        if isinstance(self._llm, GeminiWrapper):
+        if self._llm_type == LLM.Type.GEMINI:
             response = self._llm.start_conversation(self._conversation_starter)
             return response if response else "" # Since we provide the argument, we should always get a string anyway
-        elif isinstance(self._llm, GptWrapper):
+        elif self._llm_type == LLM.Type.GPT:
             response = self._llm.get_response(self._conversation_starter)
             return response
         return ""
+
+    def start_conversation_in_background(self) -> None:
+        """
+        Runs `start_conversation` on its own thread, `get_response` waits for it to finish.
+        """
+        self._conversation_started.clear()
+        Thread(target=self._start_conversation_thread, daemon=True).start()
+
+    def _start_conversation_thread(self) -> None:
+        try:
+            self.start_conversation()
+            log.info("LLM conversation started")
+        except Exception as e:
+            log.error(f"Could not start LLM conversation | {e}")
+        finally:
+            self._conversation_started.set()
     
     def get_response(self, prompt: str) -> str:
-        if isinstance(self._llm, GeminiWrapper):
+        self._conversation_started.wait()
+        if self._llm_type == LLM.Type.GEMINI:
             response = self._llm.get_response(prompt)
             return response if response else "" # Since we provide the argument, we should always get a string anyway
-        elif isinstance(self._llm, GptWrapper):
+        elif self._llm_type == LLM.Type.GPT:
             response = self._llm.get_response(prompt)
             return response
         return ""
@@ -0,0 +1,200 @@
+import logging as log
+import socket
+import time
+from collections import deque
+from typing import Optional
+from threading import Thread, Lock, Condition
+
+# Makes a single `sendmsg` call non-blocking on a blocking socket, not available on every platform
+SEND_NONBLOCKING: int = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+def send_frames(sock: socket.socket, frames: list[bytes]) -> None:
+    """
+    Writes `frames` with a single `sendmsg` (scatter/gather) call, completing any partial write with `sendall`.
+    """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(frames))
+        return
+
+    sent = sock.sendmsg(frames)
+    total = sum(len(f) for f in frames)
+    if sent < total:
+        sock.sendall(b"".join(frames)[sent:])
+
+
+def unsent_frames(frames: list[bytes], sent: int) -> list[bytes]:
+    """
+    :return: What is left of `frames` after their first `sent` bytes were written.
+    """
+    for index, frame in enumerate(frames):
+        if sent < len(frame):
+            return [frame[sent:]] + frames[index + 1:]
+        sent -= len(frame)
+    return []
+
+
+class BatchedWriter:
+    """
+    Outbound writer for a single connection.
+
+    While the peer keeps up, frames are written right away by the thread that writes them, with a non-blocking `sendmsg`.
+    Once the socket's buffer is full, frames queue up and a writer thread sends them, coalescing everything queued into one `sendmsg` call, so a slow peer never blocks the writing thread.
+    With a `max_delay`, every frame goes through the writer thread, which waits up to `max_delay` seconds after the first pending frame, or until `max_bytes` are pending, to batch more frames with it.
+    At most `max_pending_bytes` may be queued, frames written beyond that are dropped.
+    """
+    MAX_FRAMES: int = 512 # Stay well below the kernel's IOV_MAX
+
+    def __init__(self, sock: socket.socket, peer_ip: str, max_delay: float = 0.0, max_bytes: int = 64 * 1024, max_pending_bytes: int = 4 * 1024 * 1024):
+        """
+        :param peer_ip: The ip the peer is addressed by, its own for TCP peers. Peers on a Unix socket start as the loopback ip, and are relabeled with the ip they dialed at handshake.
+        :param max_delay: The latency cap in seconds added to a frame while waiting for others to batch with, 0 to write frames right away while the peer keeps up.
+        :param max_bytes: Pending bytes at which a batch is sent without waiting for `max_delay`.
+        :param max_pending_bytes: How many bytes may wait for a slow peer before frames are dropped.
+        """
+        self.sock: socket.socket = sock
+        self.peer_ip: str = peer_ip
+        self.max_delay: float = max_delay
+        self.max_bytes: int = max_bytes
+        self.max_pending_bytes: int = max_pending_bytes
+
+        # Whether the peer negotiated compressed frames at handshake
+        self.compress: bool = False
+
+        self.frames_written: int = 0
+        self.bytes_written: int = 0
+        self.syscalls: int = 0
+        self.frames_dropped: int = 0
+
+        # `_lock` guards the state below, `_condition` on the same lock wakes the writer thread
+        self._lock: Lock = Lock()
+        self._condition: Condition = Condition(self._lock)
+        self._pending: deque[bytes] = deque()
+        self._pending_bytes: int = 0
+        # Set while a thread owns the socket, any frames written meanwhile are left for it to send
+        self._flushing: bool = False
+        # Set while the owner is the writer thread
+        self._handed_off: bool = False
+        self._closed: bool = False
+        self._thread: Optional[Thread] = None
+
+    def write(self, frame: bytes) -> bool:
+        """
+        :return: False if the frame was dropped, as the writer is closed or too much is already pending.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if self._pending_bytes + len(frame) > self.max_pending_bytes:
+                self.frames_dropped += 1
+                if self.frames_dropped == 1 or self.frames_dropped % 1000 == 0:
+                    log.error(f"Dropped {self.frames_dropped} frames to client `{self.peer_ip}` as it is not reading")
+                return False
+
+            if self._flushing or self.max_delay > 0 or not SEND_NONBLOCKING:
+                self._pending.append(frame)
+                self._pending_bytes += len(frame)
+                if self._flushing:
+                    self._condition.notify()
+                else:
+                    self._flushing = True
+                    self._hand_off()
+                return True
+            self._flushing = True
+
+        self._send_inline([frame])
+        return True
+
+    def close(self) -> None:
+        """
+        Stops the writer once the frames queued so far were sent, the socket itself is left open.
+        """
+        with self._lock:
+            self._closed = True
+            self._condition.notify()
+
+    def _take_batch(self) -> list[bytes]:
+        """
+        Must be called holding `_lock`.
+        """
+        batch = []
+        while self._pending and len(batch) < self.MAX_FRAMES:
+            batch.append(self._pending.popleft())
+        self._pending_bytes -= sum(len(f) for f in batch)
+        return batch
+
+    def _hand_off(self) -> None:
+        """
+        Makes the writer thread the owner of the socket, must be called holding `_lock`.
+        """
+        self._handed_off = True
+        if not self._thread:
+            self._thread = Thread(target=self._write_loop, daemon=True)
+            self._thread.start()
+        else:
+            self._condition.notify()
+
+    def _send_inline(self, batch: list[bytes]) -> None:
+        """
+        Sends `batch`, then any frames written meanwhile, on the calling thread for as long as the socket takes them without blocking.
+        """
+        while True:
+            try:
+                sent = self.sock.sendmsg(batch, [], SEND_NONBLOCKING)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                log.info(f"Sending to client failed | client: {self.sock} | error: {e}")
+                sent = -1
+
+            if sent >= 0:
+                self.syscalls += 1
+                self.bytes_written += sent
+                rest = unsent_frames(batch, sent)
+                self.frames_written += len(batch) - len(rest)
+                if rest:
+                    # The peer is not keeping up, leave the rest to the writer thread
+                    with self._lock:
+                        self._pending.extendleft(reversed(rest))
+                        self._pending_bytes += sum(len(f) for f in rest)
+                        self._hand_off()
+                    return
+
+            with self._lock:
+                if not self._pending:
+                    self._flushing = False
+                    return
+                batch = self._take_batch()
+
+    def _write_loop(self) -> None:
+        with self._condition:
+            while True:
+                while not self._handed_off:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+
+                if self.max_delay > 0:
+                    deadline = time.monotonic() + self.max_delay
+                    while self._pending_bytes < self.max_bytes and len(self._pending) < self.MAX_FRAMES and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+
+                while self._pending:
+                    batch = self._take_batch()
+                    self._condition.release()
+                    try:
+                        send_frames(self.sock, batch)
+                    except OSError as e:
+                        log.info(f"Sending to client failed | client: {self.sock} | error: {e}")
+                    else:
+                        self.frames_written += len(batch)
+                        self.bytes_written += sum(len(f) for f in batch)
+                        self.syscalls += 1
+                    finally:
+                        self._condition.acquire()
+
+                self._handed_off = False
+                self._flushing = False
@@ -0,0 +1,36 @@
+from threading import Lock
+from py_intercom.networking.batched_writer import BatchedWriter
+
+
+class ClientRegistry:
+    """
+    Copy-on-write registry of the writers of connected clients.
+
+    Connects and disconnects serialize on a lock and publish a new tuple, readers (broadcast, lookup by ip) take a snapshot without locking.
+    """
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._clients: tuple[BatchedWriter, ...] = ()
+
+    def add(self, client: BatchedWriter) -> None:
+        with self._lock:
+            self._clients = self._clients + (client,)
+
+    def remove(self, client: BatchedWriter) -> bool:
+        """
+        :return: Whether `client` was registered.
+        """
+        with self._lock:
+            if client not in self._clients:
+                return False
+            self._clients = tuple(c for c in self._clients if c is not client)
+            return True
+
+    def snapshot(self) -> tuple[BatchedWriter, ...]:
+        return self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __iter__(self):
+        return iter(self._clients)
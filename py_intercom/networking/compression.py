@@ -0,0 +1,32 @@
+import zlib
+
+NAME: str = "zlib"
+LEVEL: int = 6
+# Payloads smaller than this are sent as is, deflate overhead outweighs the gain on them.
+THRESHOLD: int = 256
+
+# Preset dictionary for raw deflate, made of the strings that repeat in every pickled remote command: the `Message` class path and fields,
+# the keys and common values of `commands.json` entries. Deflate favours matches near the end of the window, so the most frequent strings are last.
+DICTIONARY: bytes = b"".join([
+    b"generic_name", b"kwargs", b"args", b"CommandsExtension.", b"shut_down", b"set_language", b"turn_off",
+    b"remote_and_local", b"remote_address", b"is_remote", b"BROADCAST", b"127.0.0.1",
+    b"\x94\x8c\x08triggers\x94]\x94(]\x94(", b"\x94\x8c\x07message\x94\x8c",
+    b"\x94\x8c\x08callback\x94\x8c", b"CommandsInterface.",
+    b"\x94\x8c\x05he_IL\x94}\x94(", b"\x94\x8c\x05en_US\x94}\x94(",
+    b"\x94\x8c\x08language\x94\x8c\x05", b"\x94\x8c\x0bcommand_map\x94}\x94(", b"\x94\x8c\ncommand_id\x94\x8c",
+    b"\x94\x8c\x04kind\x94\x8c\x07command\x94\x8c\x04data\x94}\x94(",
+    b"\x94\x8c\x07from_ip\x94N\x8c\ttarget_ip\x94\x8c",
+    b"\x8c&py_intercom.networking.intercom_server\x94\x8c\x16IntercomServer.Message\x94\x93\x94)\x81\x94}\x94(",
+])
+# Both peers must hold the exact same dictionary, so its checksum is exchanged at handshake.
+DICTIONARY_ID: int = zlib.crc32(DICTIONARY)
+
+
+def compress(payload: bytes) -> bytes:
+    compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=DICTIONARY)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def decompress(payload: bytes) -> bytes:
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=DICTIONARY)
+    return decompressor.decompress(payload) + decompressor.flush()
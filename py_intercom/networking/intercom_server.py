@@ -1,12 +1,20 @@
 import logging as log
+import os
+import tempfile
 import time
 import socket
 import pickle
 import select
+import struct
+from queue import SimpleQueue, Empty
 from typing import Optional
 from threading import Thread
 from threading import Event as Flag
 from helpers.generic.functions import *
+from py_intercom.networking.client_registry import ClientRegistry
+from py_intercom.networking.batched_writer import BatchedWriter, send_frames
+from py_intercom.networking.multicast import NodeDiscovery, MulticastChannel
+from py_intercom.networking import compression
 from piney_event.event import TypedEvent
 
 
@@ -15,6 +23,18 @@ class IntercomServer:
     BUFSIZE: int = 1024
     LOCALHOST: str = "127.0.0.1"
     MAX_CLIENTS: int = 10
+    # Clients on the server's host connect through a Unix domain socket instead of TCP loopback
+    USE_UNIX_SOCKET: bool = hasattr(socket, "AF_UNIX")
+    # How often idle loops that wait on the network check whether it is still running, in seconds
+    POLL_INTERVAL: float = 1.0
+    # Outbound frames to a client are written right away, or when set, coalesced for up to this many seconds or until this many bytes are pending, see `BatchedWriter`.
+    WRITE_BATCH_DELAY: float = 0.0
+    WRITE_BATCH_BYTES: int = 64 * 1024
+    # Bytes that may wait for a client that does not keep up before frames to it are dropped
+    WRITE_MAX_PENDING_BYTES: int = 4 * 1024 * 1024
+    # Every pickled message is prefixed by its length, as a single `recv` may hold several messages or part of one, and by its flags.
+    FRAME_HEADER: struct.Struct = struct.Struct("!IB")
+    FRAME_COMPRESSED: int = 0x1
 
     class Message:
         def __init__(self, data: dict, from_ip: Optional[str] = None, target_ip: Optional[str] = None, kind: Optional[str] = None):
@@ -34,6 +54,62 @@ class IntercomServer:
 
     received_message_from_server: TypedEvent = TypedEvent(Message)
 
+    @staticmethod
+    def encode_message(message: 'IntercomServer.Message', compress: bool = False) -> bytes:
+        """
+        :param compress: Whether to deflate the payload, only done for payloads of at least `compression.THRESHOLD` bytes.
+        """
+        payload = pickle.dumps(message)
+        flags = 0
+        if compress and len(payload) >= compression.THRESHOLD:
+            payload = compression.compress(payload)
+            flags |= IntercomServer.FRAME_COMPRESSED
+        return IntercomServer.FRAME_HEADER.pack(len(payload), flags) + payload
+
+    @staticmethod
+    def decode_messages(buffer: bytearray) -> list['IntercomServer.Message']:
+        """
+        Pops every complete frame off the front of `buffer`, leaving any trailing partial frame in place.
+        """
+        messages = []
+        header_size = IntercomServer.FRAME_HEADER.size
+        offset = 0
+        while len(buffer) - offset >= header_size:
+            length, flags = IntercomServer.FRAME_HEADER.unpack_from(buffer, offset)
+            if len(buffer) - offset - header_size < length:
+                break
+            start = offset + header_size
+            offset = start + length
+            try:
+                payload = bytes(buffer[start:offset])
+                if flags & IntercomServer.FRAME_COMPRESSED:
+                    payload = compression.decompress(payload)
+                messages.append(pickle.loads(payload))
+            except Exception as e:
+                log.error(f"Got exception while parsing message frame | {e}")
+        del buffer[:offset]
+        return messages
+
+    @staticmethod
+    def discover_server(timeout: float = 5.0) -> Optional[str]:
+        """
+        Looks for a hub on the LAN over UDP multicast, see `NodeDiscovery`.
+        :return: The hub's ip, or None if none answered within `timeout` seconds.
+        """
+        return NodeDiscovery.discover(timeout)
+
+    @staticmethod
+    def unix_socket_path() -> str:
+        return os.path.join(tempfile.gettempdir(), f"py_intercom-{IntercomServer.PORT}.sock")
+
+    @staticmethod
+    def is_unix_socket(sock: socket.socket) -> bool:
+        return IntercomServer.USE_UNIX_SOCKET and sock.family == socket.AF_UNIX
+
+    @staticmethod
+    def is_local_address(ip: str) -> bool:
+        return ip.startswith("127.") or ip == "localhost" or ip in ip4_addresses()
+
     @staticmethod
     def test_connection(to_ip: str) -> bool:
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -47,15 +123,57 @@ class IntercomServer:
     def __init__(self):
         self._server_thread: Optional[Thread] = None
         self._client_thread: Optional[Thread] = None
-        self._clients: list[socket.socket] = []
+        self._clients: ClientRegistry = ClientRegistry()
 
         self._should_disconnect: Flag = Flag()
         self._should_disconnect.clear()
         self._is_running: Flag = Flag()
 
-        self._send_queue: list[bytes] = []
-
-    def start_server(self) -> str:
+        # Any thread may enqueue, only `_client_loop` dequeues. A byte on `_send_wakeup` interrupts its `select`, the pair only exists while the loop runs.
+        self._send_queue: SimpleQueue[bytes] = SimpleQueue()
+        self._send_wakeup_reader: Optional[socket.socket] = None
+        self._send_wakeup: Optional[socket.socket] = None
+        # Set once the server accepted compressed frames from this client
+        self._compress: bool = False
+
+        self._discovery: NodeDiscovery = NodeDiscovery()
+        self._multicast: Optional[MulticastChannel] = None
+
+    def start_from_config(self, config: dict) -> str:
+        """
+        Starts as a server or as a client according to the `networking` section of the config.
+        :return: The server's ip.
+        """
+        is_server = config["is_server"] if "is_server" in config else False
+        if is_server:
+            log.info("Starting Intercom server")
+            server_ip = self.start_server()
+        else:
+            server_ip = config["server_ip"] if "server_ip" in config else None
+            if not server_ip:
+                log.info("No `server_ip` configured, looking for an Intercom server on the network")
+                server_ip = IntercomServer.discover_server()
+                if not server_ip:
+                    raise RuntimeError("Could not establish intercom as no server was discovered on the network")
+            if IntercomServer.test_connection(server_ip):
+                log.info(f"Server at `{server_ip}` is available")
+            else:
+                raise RuntimeError(f"Could not establish intercom as there is no valid server at `{server_ip}`")
+            time.sleep(1)
+            log.info(f"Starting Intercom client, connecting to ip `{server_ip}`")
+            compress = config["compression"] if "compression" in config else False
+            self.start_client(server_ip, compress)
+
+        if "multicast_broadcast" in config and config["multicast_broadcast"]:
+            log.info("Sending broadcast commands over multicast")
+            self.start_multicast()
+
+        return server_ip
+
+    def start_server(self, discoverable: bool = True) -> str:
+        """
+        :param discoverable: Whether to answer `discover_server` probes from clients on the LAN.
+        """
         if self._is_running.is_set():
             log.error("Cannot start server as it is open already.")
             return self.LOCALHOST
@@ -63,43 +181,94 @@ class IntercomServer:
         self._server_thread = Thread(target=self._server_loop)
         self._server_thread.start()
         self._should_disconnect.clear()
+        if discoverable:
+            self._discovery.start_responder()
         return self.LOCALHOST
 
+    def start_multicast(self) -> None:
+        """
+        Sends small `BROADCAST` messages as multicast datagrams instead of relaying them through the hub, and receives those sent by other nodes.
+        Should be enabled on every node, as nodes without it will only receive broadcasts that fell back to TCP.
+        Broadcasts reach the same nodes as over TCP: every client, the sender included, and not the hub.
+        """
+        if self._multicast and self._multicast.is_running():
+            log.error("Cannot start multicast as it is open already.")
+            return
+
+        self._multicast = MulticastChannel(self._on_multicast_payload)
+        self._multicast.start()
+
+    def _on_multicast_payload(self, payload: bytes, from_ip: str) -> None:
+        if self.is_server():
+            # The hub only relays broadcasts it receives over TCP, without handling them itself
+            return
+        message = pickle.loads(payload)
+        message.from_ip = from_ip
+        log.info(f"Received multicast message: {message}")
+        IntercomServer.received_message_from_server.emit(message)
+
     def _client_handler(self, client: socket.socket, addr) -> None:
-        self._clients.append(client)
+        writer = BatchedWriter(client, addr[0], self.WRITE_BATCH_DELAY, self.WRITE_BATCH_BYTES, self.WRITE_MAX_PENDING_BYTES)
+        self._clients.add(writer)
         log.info(f"Client `{client}` connected")
+        buffer = bytearray()
         try:
             with client:
                 while not self._should_disconnect.is_set():
                     data = client.recv(self.BUFSIZE)
-                    if data:
+                    if not data:
+                        log.info(f"Client `{addr}` disconnected")
+                        break
+                    buffer += data
+                    for message in self.decode_messages(buffer):
                         try:
-                            message = pickle.loads(data)
-                            message.from_ip = addr[0]
+                            if message.kind == "handshake":
+                                self._on_client_handshake(writer, message)
+                                continue
+
+                            message.from_ip = writer.peer_ip
                             log.info(f"Received message from client: `{message}`")
-                            if message.target_ip == str(addr[0]):
-                                self._send_to_client(client, pickle.dumps(message))
+                            if message.target_ip == writer.peer_ip:
+                                self._send_to_client(writer, self.encode_message(message, writer.compress))
                             else:
-                                self._broadcast(pickle.dumps(message))
+                                self._broadcast(message)
                         except Exception as e:
-                            log.error(f"Got exception while parsing data from client | {e}")
+                            log.error(f"Got exception while handling message from client | {e}")
                             continue
+        except ConnectionResetError:
+            # The client closed with frames it had not read yet, such as the handshake reply
+            log.info(f"Client `{addr}` disconnected")
         except Exception as e:
             log.error(e)
-            self._clients.remove(client)
+            self._clients.remove(writer)
+            writer.close()
             return
 
-        self._clients.remove(client)
+        self._clients.remove(writer)
+        writer.close()
+
+    def _on_client_handshake(self, client: BatchedWriter, message: 'IntercomServer.Message') -> None:
+        requested = message.data["compression"] if "compression" in message.data else None
+        client.compress = requested == {"name": compression.NAME, "dictionary_id": compression.DICTIONARY_ID}
+        if "address" in message.data and self.is_unix_socket(client.sock):
+            # Address the client by the ip it dialed, as over TCP, where its source address is the same ip
+            client.peer_ip = message.data["address"]
+        log.info(f"Client `{client.sock}` handshake | compression: {client.compress} | address: {client.peer_ip}")
+        reply = IntercomServer.Message({"compression": compression.NAME if client.compress else None}, kind="handshake")
+        self._send_to_client(client, self.encode_message(reply))
 
     def _server_loop(self) -> None:
         self._is_running.set()
         try:
-            while self.is_running():
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-                    server_socket.setsockopt(
-                        socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                    server_socket.bind(("0.0.0.0", self.PORT))
-                    server_socket.listen(self.MAX_CLIENTS)
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+                server_socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                server_socket.bind(("0.0.0.0", self.PORT))
+                server_socket.listen(self.MAX_CLIENTS)
+                # Only once the port is ours, so a second server on it cannot take over the socket of the one running
+                if self.USE_UNIX_SOCKET:
+                    Thread(target=self._unix_server_loop, daemon=True).start()
+                while self.is_running():
                     client_socket, address = server_socket.accept()
                     client_thread = Thread(target=self._client_handler, args=[client_socket, address])
                     client_thread.start()
@@ -109,61 +278,141 @@ class IntercomServer:
 
         self._is_running.clear()
 
-    def _broadcast(self, message: bytes) -> None:
-        """Broadcasts a message to all connected clients."""
-        for client in self._clients.copy():  # Use copy to avoid modification errors
-            self._send_to_client(client, message)
+    def _unix_server_loop(self) -> None:
+        path = self.unix_socket_path()
+        try:
+            if not self._remove_stale_unix_socket(path):
+                return
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server_socket:
+                server_socket.bind(path)
+                try:
+                    server_socket.listen(self.MAX_CLIENTS)
+                    log.info(f"Accepting local clients at `{path}`")
+                    while self.is_running():
+                        client_socket, _address = server_socket.accept()
+                        # Addressed as the loopback ip until its handshake names the ip it dialed
+                        client_thread = Thread(target=self._client_handler, args=[client_socket, (self.LOCALHOST, 0)])
+                        client_thread.start()
+                finally:
+                    os.unlink(path)
+        except OSError as e:
+            log.error(f"Local clients will connect over TCP, as the Unix socket at `{path}` failed | {e}")
 
-    def _send_to_client(self, client: socket.socket, message: bytes) -> None:
-        log.debug(f"Sending message to client `{client}`")
+    @staticmethod
+    def _remove_stale_unix_socket(path: str) -> bool:
+        """
+        Removes the socket at `path` if it was left behind by a server that did not exit cleanly.
+        :return: Whether `path` is free to bind, False if a server is still accepting on it.
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         try:
-            client.sendall(message)
-        except ConnectionError as e:
-            # self._clients.remove(client)  # Remove disconnected client
-            log.info(f"Sending to client received ConnectionError | client: {client} | error: {e}")
+            probe.connect(path)
+        except FileNotFoundError:
+            return True
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return True
+        except OSError as e:
+            log.error(f"Local clients will connect over TCP, as the Unix socket at `{path}` could not be checked | {e}")
+            return False
+        finally:
+            probe.close()
 
-    def _send_to_client_by_ip(self, ip: str, message: bytes) -> None:
-        for c in self._clients:
-            if c.getsockname()[0] == ip:
-                self._send_to_client(c, message)
+        log.error(f"Local clients will connect over TCP, as another server is accepting at `{path}`")
+        return False
 
-    def start_client(self, server_ip: str) -> None:
+    def _broadcast(self, message: 'IntercomServer.Message') -> None:
+        """Broadcasts a message to all connected clients."""
+        frames: dict[bool, bytes] = {} # Encode once per compression setting, not once per client
+        for client in self._clients.snapshot():
+            if client.compress not in frames:
+                frames[client.compress] = self.encode_message(message, client.compress)
+            self._send_to_client(client, frames[client.compress])
+
+    def _send_to_client(self, client: BatchedWriter, message: bytes) -> None:
+        log.debug(f"Sending message to client `{client.peer_ip}`")
+        client.write(message)
+
+    def _send_to_client_by_ip(self, ip: str, message: 'IntercomServer.Message') -> None:
+        frames: dict[bool, bytes] = {}
+        for c in self._clients.snapshot():
+            if c.peer_ip == ip:
+                if c.compress not in frames:
+                    frames[c.compress] = self.encode_message(message, c.compress)
+                self._send_to_client(c, frames[c.compress])
+
+    def get_write_stats(self) -> dict[str, int]:
+        """
+        :return: Totals over the currently connected clients of frames and bytes sent to them, of the send syscalls used, and of the frames dropped as a client did not keep up.
+        """
+        stats = {"frames": 0, "bytes": 0, "syscalls": 0, "dropped": 0}
+        for c in self._clients.snapshot():
+            stats["frames"] += c.frames_written
+            stats["bytes"] += c.bytes_written
+            stats["syscalls"] += c.syscalls
+            stats["dropped"] += c.frames_dropped
+        return stats
+
+    def start_client(self, server_ip: str, compress: bool = False) -> None:
+        """
+        :param compress: Whether to ask the server for compressed frames, see `compression`.
+        """
         if self._is_running.is_set():
             log.error("Cannot start client as it is open already.")
             return
 
-        client_thread = Thread(target=self._client_loop, args=[server_ip])
+        client_thread = Thread(target=self._client_loop, args=[server_ip, compress])
         client_thread.start()
         self._should_disconnect.clear()
 
-    def _client_loop(self, server_ip: str) -> None:
+    def _client_loop(self, server_ip: str, compress: bool = False) -> None:
+        self._send_wakeup_reader, self._send_wakeup = socket.socketpair()
+        self._send_wakeup_reader.setblocking(False)
+        self._send_wakeup.setblocking(False)
         self._is_running.set()
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-                client_socket.connect((server_ip, self.PORT))
+            with self._connect(server_ip) as client_socket:
                 log.info(f"Successfully connected to server at ip `{server_ip}`")
+                self._compress = False
+                hello = {}
+                if compress:
+                    hello["compression"] = {"name": compression.NAME, "dictionary_id": compression.DICTIONARY_ID}
+                if self.is_unix_socket(client_socket):
+                    # A Unix socket has no source ip, tell the server the one this client is addressed by
+                    hello["address"] = socket.gethostbyname(server_ip)
+                if hello:
+                    client_socket.sendall(self.encode_message(IntercomServer.Message(hello, kind="handshake")))
+                buffer = bytearray()
                 while not self._should_disconnect.is_set():
-                    if self._send_queue:
-                        message = self._send_queue.pop(0)
-                        client_socket.sendall(message)
+                    self._flush_send_queue(client_socket)
                     try:
-                        ready = select.select([client_socket], [], [])
-                        data = None
-                        if ready[0]:
-                            data = client_socket.recv(self.BUFSIZE)
-                        else:
+                        ready = select.select([client_socket, self._send_wakeup_reader], [], [])
+                        if self._send_wakeup_reader in ready[0]:
+                            self._drain_wakeup()
+                        if client_socket not in ready[0]:
                             continue
 
-                        try:
-                            message = pickle.loads(data)
-                            if message.target_ip != "BROADCAST" and message.target_ip not in ip4_addresses():
+                        data = client_socket.recv(self.BUFSIZE)
+                        if not data:
+                            log.info(f"Server at ip `{server_ip}` closed the connection")
+                            break
+                        buffer += data
+
+                        for message in self.decode_messages(buffer):
+                            try:
+                                if message.kind == "handshake":
+                                    self._compress = message.data["compression"] == compression.NAME
+                                    log.info(f"Server handshake | compression: {self._compress}")
+                                    continue
+
+                                if message.target_ip != "BROADCAST" and message.target_ip not in ip4_addresses():
+                                    continue
+
+                                log.info(f"Received from server: {message}")
+                                IntercomServer.received_message_from_server.emit(message)
+                            except Exception as e:
+                                log.error(f"Got exception while handling message from server | {e}")
                                 continue
-
-                            log.info(f"Received from server: {message}")
-                            IntercomServer.received_message_from_server.emit(message)
-                        except Exception as e:
-                            log.error(f"Got exception while parsing data from server | {e}")
-                            continue
                     except ConnectionError as e:
                         log.error(
                             f"Connection error on client `{client_socket.getsockname()}`: `{e}")
@@ -171,31 +420,111 @@ class IntercomServer:
         except Exception as e:
             self._is_running.clear()
             raise e
+        finally:
+            self._close_wakeup()
 
         self._is_running.clear()
 
+    def _connect(self, server_ip: str) -> socket.socket:
+        """
+        Connects through the server's Unix socket when it runs on this host, falling back to TCP.
+        """
+        if self.USE_UNIX_SOCKET and self.is_local_address(server_ip) and os.path.exists(self.unix_socket_path()):
+            unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                unix_socket.connect(self.unix_socket_path())
+                log.info(f"Connected to local server through `{self.unix_socket_path()}`")
+                return unix_socket
+            except OSError as e:
+                unix_socket.close()
+                log.info(f"Could not connect through `{self.unix_socket_path()}`, using TCP | {e}")
+
+        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            tcp_socket.connect((server_ip, self.PORT))
+        except Exception:
+            tcp_socket.close()
+            raise
+        return tcp_socket
+
+    def _flush_send_queue(self, client_socket: socket.socket) -> None:
+        """
+        Sends everything queued so far, `BatchedWriter.MAX_FRAMES` frames per syscall.
+        """
+        while True:
+            batch = []
+            while len(batch) < BatchedWriter.MAX_FRAMES:
+                try:
+                    batch.append(self._send_queue.get_nowait())
+                except Empty:
+                    break
+            if not batch:
+                return
+            send_frames(client_socket, batch)
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._send_wakeup_reader.recv(self.BUFSIZE):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _wake_client_loop(self) -> None:
+        wakeup = self._send_wakeup
+        if not wakeup:
+            return
+        try:
+            wakeup.send(b"\0")
+        except BlockingIOError:
+            # Wakeup buffer is full, the loop is already due to wake up.
+            pass
+        except OSError:
+            # The loop exited and closed the pair meanwhile
+            pass
+
+    def _close_wakeup(self) -> None:
+        reader, wakeup = self._send_wakeup_reader, self._send_wakeup
+        self._send_wakeup_reader, self._send_wakeup = None, None
+        if reader:
+            reader.close()
+        if wakeup:
+            wakeup.close()
+
     def send_data(self, data: dict, target_ip: Optional[str], kind: Optional[str] = None) -> None:
         if not self.is_running():
             log.error("Cannot send data as networking is not running.")
             return
 
         message = IntercomServer.Message(data, target_ip=target_ip, kind=kind)
+        if target_ip == "BROADCAST" and self._multicast and self._multicast.send(pickle.dumps(message)):
+            log.debug(f"Sent multicast broadcast message | {message}")
+            if not self.is_server():
+                # Over TCP the hub sends a client's broadcast back to it, the channel drops our own datagrams so deliver it here
+                message.from_ip = self.LOCALHOST
+                IntercomServer.received_message_from_server.emit(message)
+            return
+
         if self.is_server():
             if target_ip and target_ip != "BROADCAST":
                 log.debug(f"Server sending message | {message}")
-                self._send_to_client_by_ip(target_ip, pickle.dumps(message))
+                self._send_to_client_by_ip(target_ip, message)
             else:
                 log.debug(f"Server sending broadcast message | {message}")
-                self._broadcast(pickle.dumps(message))
+                self._broadcast(message)
         else:
             if target_ip == "BROADCAST":
                 message.target_ip = "127.0.0.1"
 
             log.debug(f"Client wants to send data `{data}`")
-            self._send_queue.append(pickle.dumps(message))
+            self._send_queue.put(self.encode_message(message, self._compress))
+            self._wake_client_loop()
 
     def disconnect(self) -> None:
         self._should_disconnect.set()
+        self._discovery.stop_responder()
+        if self._multicast:
+            self._multicast.stop()
+        self._wake_client_loop()
 
     def is_running(self) -> bool:
         return self._is_running.is_set()
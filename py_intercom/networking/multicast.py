@@ -0,0 +1,220 @@
+import logging as log
+import socket
+import struct
+import time
+import uuid
+from collections import deque
+from typing import Callable, Optional
+from threading import Thread, Lock
+from threading import Event as Flag
+
+
+def _open_multicast_listener(group: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", port))
+    mreq = struct.pack("4sl", socket.inet_aton(group), socket.INADDR_ANY)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    return sock
+
+
+def _open_multicast_sender(ttl: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    return sock
+
+
+class NodeDiscovery:
+    """
+    Zero-config lookup of the intercom hub over UDP multicast.
+
+    The hub runs `start_responder`, clients call `discover` which sends a probe to the group and waits for the hub's unicast reply.
+    """
+    GROUP: str = "239.255.70.91"
+    PORT: int = 7092
+    TTL: int = 1
+    PROBE: bytes = b"PYINTERCOM?"
+    REPLY: bytes = b"PYINTERCOM!"
+    POLL_INTERVAL: float = 1.0
+
+    def __init__(self):
+        self._thread: Optional[Thread] = None
+        self._should_stop: Flag = Flag()
+
+    def start_responder(self) -> None:
+        if self._thread and self._thread.is_alive():
+            log.error("Discovery responder is already running.")
+            return
+
+        self._should_stop.clear()
+        self._thread = Thread(target=self._responder_loop, daemon=True)
+        self._thread.start()
+
+    def stop_responder(self) -> None:
+        self._should_stop.set()
+
+    def _responder_loop(self) -> None:
+        try:
+            sock = _open_multicast_listener(self.GROUP, self.PORT)
+        except OSError as e:
+            log.error(f"Could not open discovery responder | {e}")
+            return
+
+        with sock:
+            sock.settimeout(self.POLL_INTERVAL)
+            while not self._should_stop.is_set():
+                try:
+                    data, addr = sock.recvfrom(len(self.PROBE))
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    log.error(f"Discovery responder stopped | {e}")
+                    return
+                if data != self.PROBE:
+                    continue
+                log.debug(f"Answering discovery probe from `{addr[0]}`")
+                try:
+                    sock.sendto(self.REPLY, addr)
+                except OSError as e:
+                    log.info(f"Could not answer discovery probe from `{addr[0]}` | {e}")
+
+    @staticmethod
+    def discover(timeout: float = 5.0, retry_interval: float = 0.5) -> Optional[str]:
+        """
+        :return: The hub's ip, or None if no hub answered within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with _open_multicast_sender(NodeDiscovery.TTL) as sock:
+            while time.monotonic() < deadline:
+                sock.sendto(NodeDiscovery.PROBE, (NodeDiscovery.GROUP, NodeDiscovery.PORT))
+                sock.settimeout(max(0.0, min(retry_interval, deadline - time.monotonic())))
+                try:
+                    data, addr = sock.recvfrom(len(NodeDiscovery.REPLY))
+                except socket.timeout:
+                    continue
+                if data != NodeDiscovery.REPLY:
+                    continue
+                log.info(f"Discovered intercom server at `{addr[0]}`")
+                return addr[0]
+
+        return None
+
+
+class MulticastChannel:
+    """
+    Best-effort datagram channel for small broadcast payloads.
+
+    Every datagram carries the sender's node id and a sequence number. Each one is sent `REDUNDANCY` times to mask packet loss, receivers drop the copies they already delivered.
+    Payloads larger than `MAX_PAYLOAD` should go through TCP instead.
+    """
+    GROUP: str = "239.255.70.91"
+    PORT: int = 7093
+    TTL: int = 1
+    MAX_PAYLOAD: int = 1200
+    REDUNDANCY: int = 2
+    DEDUP_WINDOW: int = 256
+    POLL_INTERVAL: float = 1.0
+    HEADER: struct.Struct = struct.Struct("!4s16sQ")
+    MAGIC: bytes = b"PIMC"
+
+    def __init__(self, on_payload: Callable[[bytes, str], None]):
+        """
+        :param on_payload: Called from the receive thread with the payload and the sender's ip, once per distinct payload sent by another node.
+        """
+        self._on_payload: Callable[[bytes, str], None] = on_payload
+        self._node_id: bytes = uuid.uuid4().bytes
+        self._seq: int = 0
+        self._seq_lock: Lock = Lock()
+        self._seen: dict[bytes, tuple[deque, set]] = {}
+
+        self._sender: Optional[socket.socket] = None
+        self._thread: Optional[Thread] = None
+        self._should_stop: Flag = Flag()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            log.error("Multicast channel is already running.")
+            return
+
+        self._sender = _open_multicast_sender(self.TTL)
+        self._should_stop.clear()
+        self._thread = Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._should_stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def fits(self, payload: bytes) -> bool:
+        return len(payload) <= self.MAX_PAYLOAD
+
+    def send(self, payload: bytes) -> bool:
+        """
+        :return: False if the channel is not running or `payload` is too large, in which case the caller should fall back to TCP.
+        """
+        if not self._sender or not self.is_running() or not self.fits(payload):
+            return False
+
+        with self._seq_lock:
+            self._seq += 1
+            seq = self._seq
+        datagram = self.HEADER.pack(self.MAGIC, self._node_id, seq) + payload
+        try:
+            for _ in range(self.REDUNDANCY):
+                self._sender.sendto(datagram, (self.GROUP, self.PORT))
+        except OSError as e:
+            log.error(f"Could not send multicast datagram | {e}")
+            return False
+        return True
+
+    def _is_duplicate(self, node_id: bytes, seq: int) -> bool:
+        if node_id not in self._seen:
+            self._seen[node_id] = (deque(), set())
+        order, seen = self._seen[node_id]
+        if seq in seen:
+            return True
+
+        order.append(seq)
+        seen.add(seq)
+        if len(order) > self.DEDUP_WINDOW:
+            seen.discard(order.popleft())
+        return False
+
+    def _receive_loop(self) -> None:
+        try:
+            sock = _open_multicast_listener(self.GROUP, self.PORT)
+        except OSError as e:
+            log.error(f"Could not open multicast channel | {e}")
+            return
+
+        with sock:
+            sock.settimeout(self.POLL_INTERVAL)
+            while not self._should_stop.is_set():
+                try:
+                    datagram, addr = sock.recvfrom(self.HEADER.size + self.MAX_PAYLOAD)
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    log.error(f"Multicast channel stopped | {e}")
+                    return
+
+                if len(datagram) < self.HEADER.size:
+                    continue
+                magic, node_id, seq = self.HEADER.unpack_from(datagram)
+                if magic != self.MAGIC or node_id == self._node_id:
+                    continue
+                if self._is_duplicate(node_id, seq):
+                    continue
+
+                try:
+                    self._on_payload(datagram[self.HEADER.size:], addr[0])
+                except Exception as e:
+                    log.error(f"Got exception while handling multicast payload | {e}")
+
+        if self._sender:
+            self._sender.close()
+            self._sender = None
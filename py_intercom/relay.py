@@ -0,0 +1,92 @@
+import logging as log
+from typing import Callable, Optional
+from threading import Thread
+from threading import Event as Flag
+from py_intercom.networking.intercom_server import IntercomServer
+from py_intercom.command.command_manager import CommandManager
+from py_intercom.command.command_executor import CommandExecutor
+from piney_event.event import TypedEvent
+
+
+class IntercomRelay:
+    """
+    Headless intercom node that only executes the commands it receives over the network.
+
+    Exposes the same events and loop control as `Intercom`, without voice recognition, TTS or an LLM.
+    """
+    def __init__(self, config: dict, command_map: dict[str,dict[str,dict]], command_manager: CommandManager = CommandManager({})):
+        self.command_requested: TypedEvent = TypedEvent(str, str, dict)
+
+        self._config: dict = config
+        self._language: str = self._config["intercom"]["default_language"] if "intercom" in self._config and "default_language" in self._config["intercom"] else ""
+        self._command_dispatcher: Optional[Callable[[str, str, dict], Optional[str]]] = None
+        self._command_executor: CommandExecutor = CommandExecutor.from_config(self._config["commands"] if "commands" in self._config else {})
+
+        if "networking" not in self._config:
+            raise RuntimeError("Cannot start relay without a `networking` configuration")
+
+        self._command_manager: CommandManager = command_manager
+        self._command_manager.set_command_map(command_map)
+
+        self._server_manager: IntercomServer = IntercomServer()
+        self._server_ip: str = self._server_manager.start_from_config(self._config["networking"])
+        self._server_manager.received_message_from_server.connect(self._on_received_message_from_server)
+
+        self._exit_code: int = 0
+        self._main_loop: Optional[Thread] = None
+        self._loop_should_stop: Flag = Flag()
+        self._loop_should_stop.clear()
+
+    def start_main_loop(self) -> None:
+        self._main_loop = Thread(target=self.main_loop_thread)
+        self._main_loop.start()
+        self._loop_should_stop.clear()
+
+    def stop_main_loop(self) -> None:
+        log.info("Stopping relay loop")
+        self._loop_should_stop.set()
+        self._command_executor.shutdown()
+        self._server_manager.disconnect()
+
+    def main_loop_thread(self) -> None:
+        # Commands run on the command executor, this loop only watches the connection and keeps the relay alive while it is up
+        while not self._loop_should_stop.wait(IntercomServer.POLL_INTERVAL):
+            if not self._server_manager.is_running():
+                log.info("Relay lost its connection")
+                self._exit_code = -1
+                break
+
+    def _on_received_message_from_server(self, message: IntercomServer.Message) -> None:
+        if message.kind != "command":
+            return
+
+        command_id = message.data["command_id"]
+        command_map = message.data["command_map"]
+        language = message.data["language"]
+        log.info(f"Relay executing command `{command_id}`")
+
+        self.command_requested.emit(command_id, language, command_map)
+        if not self._command_dispatcher:
+            return
+
+        self._command_executor.submit_command(
+            command_id, language, command_map, self._command_dispatcher,
+            lambda say: log.info(f"Command `{command_id}` returned `{say}`, relays have no TTS")
+        )
+
+    def set_command_dispatcher(self, dispatcher: Callable[[str, str, dict], Optional[str]]) -> None:
+        """
+        :param dispatcher: Executes a confirmed command, called with `(command_id, language, command_map)`, possibly from several threads at once. Returns the text to say, if any.
+        """
+        self._command_dispatcher = dispatcher
+
+    def set_language(self, to: str) -> None:
+        self._language = to
+    def get_language(self) -> str:
+        return self._language
+
+    def get_config(self) -> dict:
+        return self._config
+
+    def get_exit_code(self) -> int:
+        return self._exit_code